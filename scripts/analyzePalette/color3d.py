@@ -3,22 +3,20 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from skimage.color import rgb2lab, lab2lch
 from IPython.display import HTML
+from scripts.common import color
 
 # Constants
 POINT_SIZE = 10
 FIGURE_SIZE = (30, 10)
 
-# Function to convert sRGB to Linear RGB
+# Function to convert sRGB to Linear RGB (works on scalars and whole arrays)
 def srgb_to_linear(value):
-    if value <= 0.04045:
-        return value / 12.92
-    else:
-        return ((value + 0.055) / 1.055) ** 2.4
+    return color.srgb_to_linear_batch(value)
 
 # Function to convert RGB to OKLAB (using approximation via LAB)
 def rgb_to_oklab(rgb):
     # RGB to Linear RGB
-    linear_rgb = np.array([srgb_to_linear(c) for c in rgb])
+    linear_rgb = srgb_to_linear(rgb)
     return rgb2lab(linear_rgb.reshape(1, 1, 3)).reshape(3)  # Convert RGB to LAB as an approximation for OKLAB
 
 # Function to convert OKLAB to OKLCH
@@ -27,10 +25,11 @@ def oklab_to_oklch(oklab):
 
 # Function to flatten color analyzePalette and convert to different color spaces
 def process_color_palette(rgb_colors):
-    # Convert RGB to Linear RGB and then to OKLAB
-    oklab_colors = np.array([rgb_to_oklab(color) for color in rgb_colors])
+    # Convert RGB to Linear RGB and then to OKLAB (all colors at once)
+    linear_rgb = srgb_to_linear(rgb_colors)
+    oklab_colors = rgb2lab(linear_rgb.reshape(-1, 1, 3)).reshape(-1, 3)
     # Convert OKLAB to OKLCH
-    oklch_colors = np.array([oklab_to_oklch(oklab) for oklab in oklab_colors])
+    oklch_colors = lab2lch(oklab_colors.reshape(-1, 1, 3)).reshape(-1, 3)
     return rgb_colors, oklab_colors, oklch_colors
 
 # Plotting function for 4 color spaces
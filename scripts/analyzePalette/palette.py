@@ -1,7 +1,16 @@
-import json
+import argparse
 import scripts.common.color as color
+import scripts.common.instrument as instrument
+import scripts.common.jsonstream as jsonstream
 import numpy as np
 import itertools as itertools
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# 並列実行時のデフォルト設定
+DEFAULT_WORKERS = 1  # 1の場合は並列化せずに現在のプロセスで処理する
+DEFAULT_CHUNK_SIZE = 2000  # 1回にまとめて判定するパレット数（並列時は1つのワーカーに渡す単位）
 
 # 色相の距離を計算する関数
 def calculate_hue_distance(hue1, hue2):
@@ -74,12 +83,14 @@ def score_tetrad(hsl_palette):
 
 
 def score_oklch_balance(oklch_palette):
-    """OKLCHに基づく視覚的調和のスコアを計算する"""
-    distances = [np.linalg.norm([oklch_palette[i].L - oklch_palette[j].L,
-                                 oklch_palette[i].C - oklch_palette[j].C,
-                                 oklch_palette[i].H - oklch_palette[j].H])
-                 for i in range(len(oklch_palette)) for j in range(i + 1, len(oklch_palette))]
-    avg_distance = sum(distances) / len(distances)
+    """
+    OKLCHに基づく視覚的調和のスコアを計算する。
+    距離は (L, C, H) をそのまま並べたユークリッド距離で、しきい値はこの距離に合わせてある
+    （知覚的な色差が必要な場合は scripts.common.colordiff を使う）。
+    """
+    pairs = combination_indices(len(oklch_palette))[0]
+    distances = pairwise_oklch_distances(np.array(oklch_palette, dtype=float)[None], pairs)[0]
+    avg_distance = distances.sum() / len(distances)
     if avg_distance < 0.2:  # 小さいほど調和が取れている
         return 5
     return 0
@@ -115,7 +126,7 @@ def determine_color_scheme_for_4_colors(hex_palette: list[str]) -> tuple[str, li
 
     # 各3色の組み合わせに対して配色手法を判定
     for combination in color_combinations:
-        rgb_palette = [color.Hex(hex_color).to_srgb() for hex_color in combination]
+        rgb_palette = color.colors_from_array(color.Srgb, color.hex_to_srgb_batch(combination))
         best_match, scores = calculate_total_score(rgb_palette)
         combination_scores.append((combination, best_match, scores))
 
@@ -132,22 +143,171 @@ def determine_color_scheme_for_4_colors(hex_palette: list[str]) -> tuple[str, li
 
     return final_pattern, combination_scores
 
-def process_color_data(data: list[list[str]]) -> list[str]:
+# 配色手法の名前（calculate_total_score の scores と同じ順序）
+SCHEME_NAMES = ["monochromatic", "analogous", "complementary", "split_complementary", "triad", "tetrad",
+                "oklch_balance"]
+
+# 色相距離のペア単位の判定に使うビット
+COMPLEMENTARY_BIT = 1
+SPLIT_COMPLEMENTARY_BIT = 2
+TRIAD_BIT = 4
+TETRAD_BIT = 8
+
+
+@functools.lru_cache(maxsize=None)
+def combination_indices(palette_size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    カラーパレットデータを処理し、各パレットに対して配色パターンを判定する。
+    n色パレットの色のペアと3色の組み合わせのインデックスを返す。
+
+    Returns:
+    pairs (np.array): (ペア数, 2) の色のペア（i < j の順）
+    triplets (np.array): (組み合わせ数, 3) の3色の組み合わせ
+    triplet_pairs (np.array): (組み合わせ数, 3) の各組み合わせに含まれるペアの pairs 上のインデックス
+    """
+    pairs = list(itertools.combinations(range(palette_size), 2))
+    pair_ids = {pair: k for k, pair in enumerate(pairs)}
+    triplets = list(itertools.combinations(range(palette_size), 3))
+    triplet_pairs = [[pair_ids[(a, b)], pair_ids[(a, c)], pair_ids[(b, c)]] for a, b, c in triplets]
+    return (np.array(pairs, dtype=np.intp).reshape(-1, 2), np.array(triplets, dtype=np.intp).reshape(-1, 3),
+            np.array(triplet_pairs, dtype=np.intp).reshape(-1, 3))
+
+
+def pairwise_hue_distances(hues: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """(N, n) の色相から (N, ペア数) の色相距離を計算する"""
+    diff = np.abs(hues[:, pairs[:, 0]] - hues[:, pairs[:, 1]])
+    return np.minimum(diff, 360 - diff)
+
+
+def pairwise_oklch_distances(oklch: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """(N, n, 3) のOKLCHから score_oklch_balance と同じ (N, ペア数) の距離を計算する"""
+    diff = oklch[:, pairs[:, 0]] - oklch[:, pairs[:, 1]]
+    return np.sqrt(diff[..., 0] * diff[..., 0] + diff[..., 1] * diff[..., 1] + diff[..., 2] * diff[..., 2])
+
+
+def score_palettes_batch(rgb_palettes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (N, n, 3) のsRGBパレット配列に対して、全ての3色の組み合わせと全ての配色手法をまとめてスコアリングする。
+    色のペアごとの距離と判定はパレットごとに1度だけ計算し、全ての組み合わせと配色手法で使い回す。
 
     Parameters:
-    data (np.array): OKLCH色空間で表されたカラーパレットデータ
+    rgb_palettes (np.array): sRGB (0-1) で表された同じ色数 (n >= 3) のカラーパレットの配列
 
     Returns:
-    results (list): 各パレットに対して判定された配色パターンとその詳細
+    scores (np.array): (N, 組み合わせ数, 配色手法数) の各スコア
+    best_matches (np.array): (N, 組み合わせ数) の最もスコアが高い配色手法のインデックス
+    final_patterns (np.array): (N,) の最終的な配色手法のインデックス
     """
-    results: list[dict] = []
+    rgb_palettes = np.asarray(rgb_palettes, dtype=float)
+    if rgb_palettes.ndim != 3 or rgb_palettes.shape[1] < 3:
+        raise ValueError(f"3色以上のパレットの (N, n, 3) 配列が必要です: {rgb_palettes.shape}")
+    pairs, triplets, triplet_pairs = combination_indices(rgb_palettes.shape[1])
+
+    hues = color.srgb_to_hsl_batch(rgb_palettes)[..., 0]
+    oklch = color.srgb_to_oklch_batch(rgb_palettes)
+
+    # ペア単位の計算（ペア数に比例）
+    hue_distances = pairwise_hue_distances(hues, pairs)
+    oklch_distances = pairwise_oklch_distances(oklch, pairs)
+    # score_complementary は range(175, 185) に含まれる整数の距離のみを補色とみなす
+    pair_flags = (
+        np.where((hue_distances == np.floor(hue_distances)) & (175 <= hue_distances) & (hue_distances <= 184),
+                 COMPLEMENTARY_BIT, 0)
+        | np.where((150 <= hue_distances) & (hue_distances <= 180), SPLIT_COMPLEMENTARY_BIT, 0)
+        | np.where((115 <= hue_distances) & (hue_distances <= 125), TRIAD_BIT, 0)
+        | np.where((85 <= hue_distances) & (hue_distances <= 95), TETRAD_BIT, 0)
+    )
+
+    # 組み合わせ単位の集約（各組み合わせに含まれる3ペアを参照するだけ）
+    max_diff = hue_distances[:, triplet_pairs].max(axis=-1)
+    triplet_flags = np.bitwise_or.reduce(pair_flags[:, triplet_pairs], axis=-1)
+    triplet_oklch = oklch_distances[:, triplet_pairs]
+    avg_distance = (triplet_oklch[..., 0] + triplet_oklch[..., 1] + triplet_oklch[..., 2]) / 3
+
+    scores = np.stack([
+        np.where(max_diff <= 5, 5, 0),
+        np.select([max_diff <= 30, max_diff <= 60], [5, 3], 0),
+        np.where(triplet_flags & COMPLEMENTARY_BIT, 5, 0),
+        np.where(triplet_flags & SPLIT_COMPLEMENTARY_BIT, 5, 0),
+        np.where(triplet_flags & TRIAD_BIT, 5, 0),
+        np.where(triplet_flags & TETRAD_BIT, 5, 0),
+        np.where(avg_distance < 0.2, 5, 0),
+    ], axis=-1)
+    best_matches = scores.argmax(axis=-1)
+
+    # 出現回数が最も多い配色手法を選ぶ（同数の場合は先に出現したものを優先）
+    is_best = best_matches[..., None] == np.arange(len(SCHEME_NAMES))
+    counts = is_best.sum(axis=1)
+    first_seen = np.where(is_best.any(axis=1), is_best.argmax(axis=1), len(triplets))
+    final_patterns = np.where(counts == counts.max(axis=1, keepdims=True), first_seen,
+                              len(triplets) + 1).argmin(axis=1)
+
+    return scores, best_matches, final_patterns
+
+
+def determine_color_scheme(hex_palette: list[str]) -> tuple[str, list]:
+    """任意の色数 (n >= 3) のパレットの配色パターンを判定する"""
+    return score_hex_palettes([hex_palette])[0]
+
+
+def score_hex_palettes(hex_palettes: list[list[str]]) -> list[tuple[str, list]]:
+    """同じ色数のHexパレットをまとめて判定し、パレットごとに (final_pattern, combination_scores) を返す"""
+    palette_size = len(hex_palettes[0])
+    return format_combination_scores(hex_palettes, *score_hex_palettes_compact(hex_palettes, palette_size))
+
+
+def score_hex_palettes_compact(hex_palettes: list[list[str]], palette_size: int):
+    """同じ色数のHexパレットをまとめて判定し、score_palettes_batch の結果を uint8 の配列で返す"""
+    with instrument.stage("convert"):
+        hex_colors = [hex_color for hex_palette in hex_palettes for hex_color in hex_palette]
+        rgb_palettes = color.hex_to_srgb_batch(hex_colors).reshape(-1, palette_size, 3)
+    with instrument.stage("score"):
+        scores, best_matches, final_patterns = score_palettes_batch(rgb_palettes)
+    return scores.astype(np.uint8), best_matches.astype(np.uint8), final_patterns.astype(np.uint8)
+
+
+def format_combination_scores(hex_palettes, scores, best_matches, final_patterns) -> list[tuple[str, list]]:
+    """score_palettes_batch の結果をパレットごとの (final_pattern, combination_scores) に変換する"""
+    triplets = combination_indices(len(hex_palettes[0]))[1].tolist()
+
+    results = []
+    with instrument.stage("format"):
+        for hex_palette, palette_scores, palette_best, final_pattern in zip(
+                hex_palettes, scores.tolist(), best_matches.tolist(), final_patterns.tolist()):
+            combination_scores = [
+                (tuple(hex_palette[j] for j in triplet), SCHEME_NAMES[best], dict(zip(SCHEME_NAMES, triplet_scores)))
+                for triplet, best, triplet_scores in zip(triplets, palette_best, palette_scores)
+            ]
+            results.append((SCHEME_NAMES[final_pattern], combination_scores))
+    return results
 
-    for hex_palette in data:
-        # 配色パターンの判定
-        final_pattern, combination_scores = determine_color_scheme_for_4_colors(hex_palette)
 
+def score_color_chunk(data: list[list[str]]) -> list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    パレットを色数ごとにまとめて判定し、結果をコンパクトな配列のまま返す（並列処理時にワーカーから返す形式）。
+
+    Returns:
+    scored (list): 色数ごとの (indices, scores, best_matches, final_patterns)。
+    indices は data 上のインデックス、残りは score_palettes_batch の結果（uint8）
+    """
+    groups: dict[int, list[int]] = {}
+    for i, hex_palette in enumerate(data):
+        groups.setdefault(len(hex_palette), []).append(i)
+
+    return [(np.array(indices, dtype=np.intp), *score_hex_palettes_compact([data[i] for i in indices], palette_size))
+            for palette_size, indices in groups.items()]
+
+
+def format_color_results(data: list[list[str]], scored) -> list[dict]:
+    """score_color_chunk の結果を process_color_data の結果の形式（入力と同じ順序）に変換する"""
+    judged: list = [None] * len(data)
+    for indices, scores, best_matches, final_patterns in scored:
+        hex_palettes = [data[i] for i in indices.tolist()]
+        for i, judgement in zip(indices.tolist(),
+                                format_combination_scores(hex_palettes, scores, best_matches, final_patterns)):
+            judged[i] = judgement
+
+    results: list[dict] = []
+    for hex_palette, (final_pattern, combination_scores) in zip(data, judged):
         # 結果を保存
         result: dict = {
             "hex_palette": [hex_color for hex_color in hex_palette],
@@ -159,34 +319,140 @@ def process_color_data(data: list[list[str]]) -> list[str]:
     return results
 
 
+def serialize_color_data(data: list[list[str]]) -> list[str]:
+    """パレットを判定し、結果を1件ずつコンパクトなJSON文字列にして返す（並列処理時はワーカー内で直列化する）"""
+    return [jsonstream.dumps_compact(result) for result in process_color_data(data)]
+
+
+def process_color_data(data: list[list[str]], workers: int = DEFAULT_WORKERS,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[dict]:
+    """
+    カラーパレットデータを処理し、各パレットに対して配色パターンを判定する。
+    パレットは色数ごとにまとめてベクトル化したエンジンで判定する。
+
+    Parameters:
+    data (np.array): Hex形式で表されたカラーパレットデータ（パレットごとの色数は任意）
+    workers (int): 並列に処理するプロセス数（1の場合は現在のプロセスで処理する）
+    chunk_size (int): 並列処理時に1つのプロセスへまとめて渡すパレット数
+
+    Returns:
+    results (list): 各パレットに対して判定された配色パターンとその詳細（入力と同じ順序）
+    """
+    if workers > 1 and len(data) > chunk_size:
+        return process_color_data_parallel(data, workers, chunk_size)
+    return format_color_results(data, score_color_chunk(data))
+
+
+def process_color_data_parallel(data: list[list[str]], workers: int,
+                                chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[dict]:
+    """パレットデータをチャンクに分割し、プロセスプールで並列に判定する（結果は入力と同じ順序）"""
+    return list(iter_color_data_results(data, workers, chunk_size))
+
+
+def map_chunks(palettes, function, workers: int, chunk_size: int):
+    """
+    パレットのイテラブルを chunk_size 件ずつ function に渡し、(チャンク, 結果) を入力と同じ順序で返す。
+    workers > 1 の場合は function をプロセスプールで実行する。
+    メモリ上に保持するのは処理中のチャンクのみなので、データセットの大きさに関わらずメモリ使用量は一定に保たれる。
+    """
+    chunks = instrument.timed_iter(jsonstream.iter_chunks(palettes, chunk_size), "load")
+    if workers <= 1:
+        for chunk in chunks:
+            instrument.count(instrument.ITEMS_COUNTER, len(chunk))
+            yield chunk, function(chunk)
+        return
+
+    def wait(chunk, future):
+        # ワーカー内のステージは計測できないため、結果を待った時間を記録する
+        with instrument.stage("wait"):
+            return chunk, future.result()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 投入済みのチャンクをワーカー数の2倍までに制限し、投入順に結果を取り出す
+        pending = deque()
+        for chunk in chunks:
+            instrument.count(instrument.ITEMS_COUNTER, len(chunk))
+            pending.append((chunk, executor.submit(function, chunk)))
+            if len(pending) >= workers * 2:
+                yield wait(*pending.popleft())
+        while pending:
+            yield wait(*pending.popleft())
+
+
+def iter_color_data_results(palettes, workers: int = DEFAULT_WORKERS, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    パレットのイテラブルを chunk_size 件ずつ判定し、結果を入力と同じ順序で1件ずつ返す。
+    並列処理時、ワーカーはコンパクトな配列（score_color_chunk）だけを返し、結果の辞書は現在のプロセスで組み立てる。
+
+    Parameters:
+    palettes (iterable): Hex形式のカラーパレットのイテラブル（iter_data の戻り値など）
+    workers (int): 並列に処理するプロセス数（1の場合は現在のプロセスで処理する）
+    chunk_size (int): 1回にまとめて判定するパレット数
+    """
+    for chunk, scored in map_chunks(palettes, score_color_chunk, workers, chunk_size):
+        yield from format_color_results(chunk, scored)
+
+
+def iter_color_data_lines(palettes, workers: int = DEFAULT_WORKERS, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    iter_color_data_results と同じ結果を、コンパクトなJSON文字列として1件ずつ返す。
+    結果の組み立てと直列化もワーカー内で行うため、現在のプロセスの処理は書き出しだけになり、ワーカー数に比例して速くなる。
+    """
+    for _, lines in map_chunks(palettes, serialize_color_data, workers, chunk_size):
+        yield from lines
+
+
 def save_results(results, output_path):
     """
-    判定結果をJSONファイルとして保存する関数。
+    判定結果を1件ずつコンパクトなJSON（拡張子が .ndjson / .jsonl の場合はNDJSON）として書き出す関数。
 
     Parameters:
-    results (list): 判定された結果のリスト
+    results (iterable): 判定された結果のイテラブル（iter_color_data_results の戻り値など）
     output_path (str): 結果を保存するファイルのパス
     """
-    with open(output_path, 'w') as f:
-        json.dump(results, f, indent=4)
+    with jsonstream.open_record_writer(output_path) as writer:
+        write = instrument.timed(writer.write, "serialize")
+        for result in results:
+            write(result)
 
 
-def load_data(file_path):
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    return np.array(data)  # NumPy配列に変換
+def save_result_lines(lines, output_path):
+    """iter_color_data_lines で直列化済みの結果を save_results と同じ形式で書き出す"""
+    with jsonstream.open_record_writer(output_path) as writer:
+        write = instrument.timed(writer.write_serialized, "serialize")
+        for line in lines:
+            write(line)
 
 
-if __name__ == "__main__":
-    # データの読み込み
-    data_path = '../../data/raw/rgbPalette.json'  # 訓練データのファイルパス
-    data: list[list[str]] = load_data(data_path)
+def iter_data(file_path):
+    """パレットデータ（JSON配列またはNDJSON）を1パレットずつ読み込む"""
+    return jsonstream.iter_records(file_path)
 
-    # カラーパレットデータを処理し、配色パターンを判定
-    results = process_color_data(data)
 
-    # 結果の保存
-    output_path = '../../data/results/palette_results.json'
-    save_results(results, output_path)
+def load_data(file_path):
+    return list(iter_data(file_path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="カラーパレットの配色パターンを判定する")
+    parser.add_argument("--input", default='../../data/raw/rgbPalette.json',
+                        help="パレットデータのファイルパス（JSON配列またはNDJSON）")
+    parser.add_argument("--output", default='../../data/results/palette_results.json',
+                        help="結果を保存するファイルのパス（拡張子が .ndjson / .jsonl の場合はNDJSON）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="並列に処理するプロセス数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回にまとめて判定するパレット数")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.run("palette", args.metrics, args.profile, args.profile_mode):
+        # データの読み込み
+        data = iter_data(args.input)
+
+        # カラーパレットデータを処理し、配色パターンを判定（結果は判定したものから順に書き出す）
+        lines = iter_color_data_lines(data, workers=args.workers, chunk_size=args.chunk_size)
+
+        # 結果の保存
+        output_path = args.output
+        save_result_lines(lines, output_path)
 
     print(f"結果が {output_path} に保存されました。")
\ No newline at end of file
@@ -0,0 +1,258 @@
+import argparse
+import functools
+import itertools
+import json
+import os
+import pickle
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.neighbors import KDTree
+
+import scripts.common.color as color
+import scripts.common.jsonstream as jsonstream
+
+INDEX_DIR = "../../data/processed/palette_index/"
+PALETTES_FILE = "palettes.npy"  # (パレット数, 色数, 3) のOKLab
+LABELS_FILE = "labels.json"  # パレットごとのラベル（URLまたはHexのパレット）
+TREE_FILE = "tree.pkl"  # 埋め込みのKD木
+
+LEAF_SIZE = 16
+PREFETCH_FACTOR = 4  # top-k 検索で最初に取り出す候補数（k の何倍か）
+# 埋め込みの距離と実際の距離が一致する場合に、丸め誤差で候補から漏れないようにするための余裕
+BOUND_TOLERANCE = 1e-9
+# 色の対応付けを全ての順列で調べる最大の色数（5色で120通り）。これより多い場合は割り当て問題として1件ずつ解く
+PERMUTATION_MAX_COLORS = 5
+# 順列で調べる際の1ブロックあたりの (候補, 順列, 色) の組の数（中間配列の大きさを候補数に関わらず一定に保つ）
+PERMUTATION_BLOCK_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=None)
+def palette_permutations(palette_size: int) -> np.ndarray:
+    """色の対応付けの全ての順列 (順列数, 色数)"""
+    return np.array(list(itertools.permutations(range(palette_size))), dtype=np.intp)
+
+
+def hex_palettes_to_oklab(hex_palettes) -> np.ndarray:
+    """Hex形式のパレットのリストを (パレット数, 色数, 3) のOKLab（線形化したsRGBから変換）に変換する"""
+    hex_palettes = [list(palette) for palette in hex_palettes]
+    if not hex_palettes:
+        return np.empty((0, 0, 3))
+    palette_size = len(hex_palettes[0])
+    if any(len(palette) != palette_size for palette in hex_palettes):
+        raise ValueError("All palettes must have the same number of colors.")
+    srgb = color.hex_to_srgb_batch([hex_value for palette in hex_palettes for hex_value in palette])
+    oklab = color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(srgb))
+    return oklab.reshape(len(hex_palettes), palette_size, 3)
+
+
+def palette_embedding(oklab_palettes) -> np.ndarray:
+    """
+    パレットの色の順序に依存しない埋め込み (パレット数, 色数 * 3)。
+    L, a, b のそれぞれをパレット内でソートして並べ、sqrt(色数) で割る。
+
+    1次元では値をソートして対応付けるのが二乗誤差最小の対応付けなので、この埋め込みのユークリッド距離は
+    matching_distances（最適な対応付けでのRMS ΔE-OK）以下になり、候補の絞り込みに使える。
+    """
+    oklab_palettes = np.asarray(oklab_palettes, dtype=np.float64)
+    palette_size = oklab_palettes.shape[-2]
+    embedded = np.sort(oklab_palettes, axis=-2).swapaxes(-1, -2)
+    return embedded.reshape(*oklab_palettes.shape[:-2], -1) / np.sqrt(palette_size)
+
+
+def permutation_block_size(palette_size: int) -> int:
+    """順列で調べる際に1ブロックで扱う候補数"""
+    return max(PERMUTATION_BLOCK_SIZE // (len(palette_permutations(palette_size)) * palette_size), 1)
+
+
+def squared_color_distances(oklab_palettes, candidates) -> np.ndarray:
+    """パレット (..., 色数, 3) と候補 (..., 色数, 3) の全ての色の組のOKLab距離の二乗 (..., 色数, 色数)"""
+    differences = np.asarray(oklab_palettes)[..., :, None, :] - np.asarray(candidates)[..., None, :, :]
+    return np.square(differences).sum(axis=-1)
+
+
+def matching_distances(oklab_palette, candidates) -> np.ndarray:
+    """
+    1つのパレット (色数, 3) と候補 (候補数, 色数, 3) の距離。
+    色の全ての対応付けのうち最小となる、対応する色同士のOKLab距離 (ΔE-OK) の二乗平均平方根。
+    PERMUTATION_MAX_COLORS 色までは全ての順列をブロックごとにまとめて調べ、
+    それより多い場合は候補ごとに二乗距離の和を最小にする割り当て問題を解く（メモリ使用量は色数の2乗に比例）。
+    """
+    oklab_palette = np.asarray(oklab_palette, dtype=np.float64)
+    candidates = np.asarray(candidates, dtype=np.float64)
+    palette_size = candidates.shape[-2]
+    if palette_size > PERMUTATION_MAX_COLORS:
+        costs = squared_color_distances(oklab_palette, candidates)
+        columns = np.array([linear_sum_assignment(cost)[1] for cost in costs], dtype=np.intp)
+        totals = np.take_along_axis(costs, columns.reshape(-1, palette_size, 1), axis=-1).sum(axis=(1, 2))
+        return np.sqrt(totals / palette_size)
+
+    permutations = palette_permutations(palette_size)
+    block = permutation_block_size(palette_size)
+    squared = [np.square(oklab_palette[None, None] - candidates[start:start + block][:, permutations])
+               .sum(axis=-1).mean(axis=-1).min(axis=-1)
+               for start in range(0, len(candidates), block)]
+    return np.sqrt(np.concatenate(squared)) if squared else np.empty(0)
+
+
+class PaletteIndex:
+    """
+    OKLabのパレットの類似検索インデックス。
+    順序に依存しない埋め込みのKD木で候補を絞り込み、最適な色の対応付けでの距離で厳密に判定する。
+    load() で開いた場合、各ファイルは最初に必要になった時点で読み込む。
+    """
+
+    def __init__(self, oklab_palettes=None, labels=None, directory=None):
+        self._palettes = None if oklab_palettes is None else np.asarray(oklab_palettes, dtype=np.float64)
+        self._labels = labels
+        self._tree = None
+        self._directory = directory
+
+    @classmethod
+    def from_hex_palettes(cls, hex_palettes, labels=None):
+        hex_palettes = list(hex_palettes)
+        return cls(hex_palettes_to_oklab(hex_palettes), labels)
+
+    @classmethod
+    def load(cls, directory=INDEX_DIR):
+        """保存したインデックスを開く（ファイルはまだ読み込まない）"""
+        return cls(directory=directory)
+
+    @property
+    def palettes(self) -> np.ndarray:
+        if self._palettes is None:
+            self._palettes = np.load(os.path.join(self._directory, PALETTES_FILE), mmap_mode='r')
+        return self._palettes
+
+    @property
+    def labels(self) -> list:
+        if self._labels is None:
+            if self._directory is not None:
+                with open(os.path.join(self._directory, LABELS_FILE), 'r') as file:
+                    self._labels = json.load(file)
+            else:
+                self._labels = list(range(len(self.palettes)))
+        return self._labels
+
+    @property
+    def tree(self) -> KDTree:
+        if self._tree is None:
+            tree_path = self._directory and os.path.join(self._directory, TREE_FILE)
+            if tree_path and os.path.exists(tree_path):
+                with open(tree_path, 'rb') as file:
+                    self._tree = pickle.load(file)
+            else:
+                self._tree = KDTree(palette_embedding(self.palettes), leaf_size=LEAF_SIZE)
+        return self._tree
+
+    def __len__(self):
+        return len(self.palettes)
+
+    def save(self, directory=INDEX_DIR):
+        """インデックス（OKLabのパレット、ラベル、KD木）をディレクトリに保存する"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, PALETTES_FILE), np.ascontiguousarray(self.palettes))
+        with open(os.path.join(directory, LABELS_FILE), 'w') as file:
+            json.dump(self.labels, file)
+        with open(os.path.join(directory, TREE_FILE), 'wb') as file:
+            pickle.dump(self.tree, file)
+
+    def _as_oklab(self, palette) -> np.ndarray:
+        """Hex形式のパレットまたはOKLabの配列を (色数, 3) のOKLabにする"""
+        if len(palette) and isinstance(palette[0], str):
+            return hex_palettes_to_oklab([palette])[0]
+        return np.asarray(palette, dtype=np.float64)
+
+    def query(self, palette, k=10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        palette に最も近い k 個のパレットを距離の昇順で返す。
+
+        埋め込みの距離は実際の距離の下限なので、候補を埋め込みの距離の順に k 件ずつ厳密に判定し、
+        それまでの k 番目の距離が次の候補の埋め込みの距離以下になった時点で打ち切れば、結果は厳密になる。
+        取り出した候補を全て判定しても打ち切れない場合は、候補を PREFETCH_FACTOR 倍に増やして続ける。
+
+        Returns:
+        (np.ndarray, np.ndarray): 距離とインデックス
+        """
+        oklab = self._as_oklab(palette)
+        total = len(self)
+        k = min(k, total)
+        if k <= 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        embedding = palette_embedding(oklab)[None]
+        fetch = min(total, k * PREFETCH_FACTOR)
+        distances, found = np.empty(0), np.empty(0, dtype=np.intp)
+        evaluated = 0
+        while True:
+            bounds, indices = self.tree.query(embedding, k=fetch)
+            bounds, indices = bounds[0], indices[0]
+            while evaluated < fetch:
+                if len(distances) == k and distances[-1] <= bounds[evaluated] - BOUND_TOLERANCE:
+                    return distances, found
+                batch = indices[evaluated:evaluated + k]
+                distances = np.concatenate([distances, matching_distances(oklab, self.palettes[batch])])
+                found = np.concatenate([found, batch])
+                # 距離が同じ場合は埋め込みの距離が小さい（先に判定した）ものを優先する
+                order = np.argsort(distances, kind='stable')[:k]
+                distances, found = distances[order], found[order]
+                evaluated += len(batch)
+            if fetch == total:
+                return distances, found
+            fetch = min(total, fetch * PREFETCH_FACTOR)
+
+    def query_radius(self, palette, radius) -> tuple[np.ndarray, np.ndarray]:
+        """palette からの距離が radius 以下の全てのパレットを距離の昇順で返す"""
+        oklab = self._as_oklab(palette)
+        indices = self.tree.query_radius(palette_embedding(oklab)[None], r=radius + BOUND_TOLERANCE)[0]
+        distances = matching_distances(oklab, self.palettes[indices])
+        within = distances <= radius
+        order = np.argsort(distances[within], kind='stable')
+        return distances[within][order], indices[within][order]
+
+
+def load_labeled_palettes(file_path) -> tuple[list, list]:
+    """
+    パレットのファイルを読み込み、Hexのパレットとラベルを返す。
+    rgbPalette.json のようなパレットの配列と、color_palettes.json のような {"url", "palette"} の配列に対応する。
+    """
+    palettes, labels = [], []
+    for record in jsonstream.iter_records(file_path):
+        if isinstance(record, dict):
+            palettes.append(record["palette"])
+            labels.append(record.get("url", len(labels)))
+        else:
+            palettes.append(record)
+            labels.append(record)
+    return palettes, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パレットの類似検索インデックスを作成・検索する")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="インデックスを作成して保存する")
+    build_parser.add_argument("--input", default="../../data/raw/rgbPalette.json", help="パレットのファイル")
+    build_parser.add_argument("--index", default=INDEX_DIR, help="インデックスの保存先")
+    query_parser = subparsers.add_parser("query", help="似ているパレットを検索する")
+    query_parser.add_argument("palette", nargs='+', help="Hex形式の色（例: '#bc7c7c' '#e4c087' ...）")
+    query_parser.add_argument("--index", default=INDEX_DIR, help="インデックスの保存先")
+    query_parser.add_argument("-k", type=int, default=10, help="返すパレットの数")
+    query_parser.add_argument("--radius", type=float, help="指定した場合は距離がこの値以下の全てのパレットを返す")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        palettes, labels = load_labeled_palettes(args.input)
+        PaletteIndex.from_hex_palettes(palettes, labels).save(args.index)
+        print(f"Indexed {len(palettes)} palettes into {args.index}")
+        return
+
+    index = PaletteIndex.load(args.index)
+    if args.radius is not None:
+        distances, indices = index.query_radius(args.palette, args.radius)
+    else:
+        distances, indices = index.query(args.palette, args.k)
+    for distance, i in zip(distances, indices):
+        print(f"{distance:.4f}  {index.labels[i]}")
+
+
+if __name__ == "__main__":
+    main()
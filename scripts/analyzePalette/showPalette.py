@@ -1,22 +1,20 @@
-import json
 import random
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from collections import defaultdict
 import scripts.common.color as color
+import scripts.common.jsonstream as jsonstream
 
 MAX_ITEMS_IN_GROUP = 300
 
 
 def load_results(file_path):
-    """保存された結果データを読み込む関数"""
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    """保存された結果データ（JSON配列またはNDJSON）を読み込む関数"""
+    return list(jsonstream.iter_records(file_path))
 
 def sort_palette_by_saturation(hex_palette):
     """パレット内の色をHSLのSaturationでソート"""
-    rgb_palette = [color.Hex(hex_color).to_srgb() for hex_color in hex_palette]
-    hsl_palette = [color.Hex(hex_color).to_hsl() for hex_color in hex_palette]
+    hsl_palette = color.colors_from_array(color.Hsl, color.hex_to_hsl_batch(hex_palette, cache=color.conversion_cache))
     sorted_palette = sorted(hsl_palette, key=lambda hsl: hsl.l)  # Saturationでソート
     sorted_hex_palette = [hsl.to_hex() for hsl in sorted_palette]
     return sorted_hex_palette
@@ -26,8 +24,7 @@ def sort_palettes_by_hue(grouped_palettes):
 
     def calculate_average_hue(hex_palette):
         """パレットの平均Hueを計算"""
-        rgb_palette = [color.Hex(hex_color).to_srgb() for hex_color in hex_palette]
-        hsl_palette = [color.Hex(hex_color).to_hsl() for hex_color in hex_palette]
+        hsl_palette = color.colors_from_array(color.Hsl, color.hex_to_hsl_batch(hex_palette, cache=color.conversion_cache))
         average_lightness = sum(hsl.l for hsl in hsl_palette) / len(hsl_palette)
         return average_lightness
 
@@ -97,7 +94,8 @@ def group_by_color_scheme(results):
 if __name__ == "__main__":
     # 判定結果データのパス
     results_path = '../../data/results/palette_results.json'  # 更新されたファイルパス
-    results = load_results(results_path)
+    # 結果は1件ずつ読み込み、グループ化に必要なパレットのみを保持する
+    results = jsonstream.iter_records(results_path)
 
     # 配色パターンごとにグループ化
     grouped_palettes = group_by_color_scheme(results)
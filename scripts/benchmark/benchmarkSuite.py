@@ -0,0 +1,206 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import time
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from scripts.analyzePalette.palette import iter_color_data_results
+from scripts.common import color
+from scripts.dataConverter.convertPalette import convert_palette_list
+from scripts.dataConverter.dedupPalettes import find_duplicate_groups
+from scripts.snapshot.snapshotToPalatte import extract_palette
+
+# 結果を保存するJSONファイル（--baseline / compare で比較に使う）
+BENCHMARK_FILE = "../../data/results/benchmark.json"
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)  # 合成データの色数（画像の場合はピクセル数）
+DEFAULT_REPEAT = 3
+# スループットがベースラインからこの割合を超えて下がったものを性能低下とみなす
+DEFAULT_THRESHOLD = 0.1
+PALETTE_SIZE = 4
+DATASET_SEED = 0
+IMAGE_BLOCK = 32  # 合成スクリーンショットの単色ブロックの大きさ（ピクセル）
+IMAGE_COLORS = 12  # 合成スクリーンショットに使う色数
+IMAGE_NOISE = 4  # 合成スクリーンショットの各ピクセルに加えるノイズの最大値（8bit値）
+
+
+class Dataset(NamedTuple):
+    size: int
+    rgb8: np.ndarray  # (size, 3) の uint8 のsRGB
+    srgb: np.ndarray  # (size, 3) のsRGB (0-1)
+    hex_colors: list[str]
+    oklch: np.ndarray  # (size, 3) のランダムなOKLCH（約7割がガマット外）
+    hex_palettes: list[list[str]]  # PALETTE_SIZE 色ずつのHexパレット
+    oklab_palettes: np.ndarray  # (パレット数, PALETTE_SIZE, 3) のOKLab
+    image: bytes  # 約 size ピクセルの合成スクリーンショット (PNG)
+
+
+def synthetic_image(pixel_count, rng) -> bytes:
+    """単色のブロックにノイズを加えた、スクリーンショットに近い色の分布の16:9のPNGを作る"""
+    width = max(int(np.sqrt(pixel_count * 16 / 9)), 1)
+    height = max(pixel_count // width, 1)
+    colors = rng.integers(0, 256, (IMAGE_COLORS, 3))
+    blocks = rng.integers(0, IMAGE_COLORS, (-(-height // IMAGE_BLOCK), -(-width // IMAGE_BLOCK)))
+    pixels = colors[np.kron(blocks, np.ones((IMAGE_BLOCK, IMAGE_BLOCK), dtype=np.int64))[:height, :width]]
+    pixels = pixels + rng.integers(-IMAGE_NOISE, IMAGE_NOISE + 1, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_dataset(size, seed=DATASET_SEED) -> Dataset:
+    """size 色の合成データを作る（同じ size と seed からは常に同じデータになる）"""
+    rng = np.random.default_rng(seed)
+    rgb8 = rng.integers(0, 256, (size, 3), dtype=np.uint8)
+    srgb = rgb8 / 255
+    hex_colors = color.srgb_to_hex_batch(srgb)
+    oklch = np.stack([rng.uniform(0, 1, size), rng.uniform(0, 0.4, size), rng.uniform(0, 360, size)], axis=-1)
+    palette_count = size // PALETTE_SIZE
+    hex_palettes = [hex_colors[i:i + PALETTE_SIZE] for i in range(0, palette_count * PALETTE_SIZE, PALETTE_SIZE)]
+    oklab_palettes = color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(
+        srgb[:palette_count * PALETTE_SIZE])).reshape(palette_count, PALETTE_SIZE, 3)
+    return Dataset(size, rgb8, srgb, hex_colors, oklch, hex_palettes, oklab_palettes, synthetic_image(size, rng))
+
+
+def consume(iterable):
+    deque(iterable, maxlen=0)
+
+
+def benchmark_cases(dataset) -> dict:
+    """ベンチマーク名と、dataset に対して計測する処理"""
+    return {
+        "color.hex_to_srgb_batch": lambda: color.hex_to_srgb_batch(dataset.hex_colors),
+        "color.srgb_to_hex_batch": lambda: color.srgb_to_hex_batch(dataset.srgb),
+        "color.srgb_to_oklch_batch": lambda: color.srgb_to_oklch_batch(dataset.srgb),
+        "color.srgb8_to_oklab": lambda: color.srgb8_to_oklab(dataset.rgb8),
+        "color.oklch_to_srgb_gamut_batch": lambda: color.oklch_to_srgb_gamut_batch(dataset.oklch),
+        # 結果はチャンクごとに捨て、CLIと同じくメモリ使用量を一定に保つ
+        "palette.iter_color_data_results": lambda: consume(iter_color_data_results(dataset.hex_palettes)),
+        "snapshotToPalatte.extract_palette": lambda: extract_palette(io.BytesIO(dataset.image), max_pixels=None),
+        "convertPalette.convert_palette_list": lambda: convert_palette_list(dataset.hex_palettes),
+        "dedupPalettes.find_duplicate_groups": lambda: find_duplicate_groups(dataset.oklab_palettes),
+    }
+
+
+def best_time(function, repeat=DEFAULT_REPEAT) -> float:
+    """function を repeat 回実行し、最短の実行時間を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, only=None) -> dict:
+    """
+    全てのサイズと処理の組み合わせを計測し、JSONに保存できる結果を返す。
+    only を指定した場合は、名前にいずれかの文字列を含むベンチマークのみを計測する。
+    """
+    results = []
+    for size in sizes:
+        dataset = make_dataset(size)
+        for name, function in benchmark_cases(dataset).items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            seconds = best_time(function, repeat)
+            results.append({"benchmark": name, "size": size, "seconds": seconds,
+                            "items_per_second": size / seconds if seconds > 0 else float('inf')})
+            print(f"{name:<40} {size:>9} {seconds:>10.4f} {results[-1]['items_per_second']:>14.0f}")
+    return {
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def save_results(report, file_path):
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(report, file, indent=2)
+    os.replace(temp_path, file_path)
+
+
+def load_results(file_path) -> dict:
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD) -> list[dict]:
+    """
+    2つの結果の同じベンチマークとサイズのスループットを比べる。
+    ratio は current / baseline のスループットの比で、1 - threshold を下回るものを regression とする。
+    """
+    baseline_results = {(result["benchmark"], result["size"]): result for result in baseline["results"]}
+    comparisons = []
+    for result in current["results"]:
+        base = baseline_results.get((result["benchmark"], result["size"]))
+        if base is None:
+            continue
+        ratio = result["items_per_second"] / base["items_per_second"]
+        comparisons.append({"benchmark": result["benchmark"], "size": result["size"],
+                            "baseline": base["items_per_second"], "current": result["items_per_second"],
+                            "ratio": ratio, "regression": ratio < 1 - threshold})
+    return comparisons
+
+
+def print_comparisons(comparisons, threshold=DEFAULT_THRESHOLD) -> bool:
+    """比較結果を表示し、性能低下があったかを返す"""
+    print(f"{'benchmark':<40} {'size':>9} {'baseline/s':>14} {'current/s':>14} {'ratio':>6}")
+    for comparison in comparisons:
+        mark = "  REGRESSION" if comparison["regression"] else ""
+        print(f"{comparison['benchmark']:<40} {comparison['size']:>9} {comparison['baseline']:>14.0f} "
+              f"{comparison['current']:>14.0f} {comparison['ratio']:>6.2f}{mark}")
+    regressions = sum(comparison["regression"] for comparison in comparisons)
+    print(f"{regressions} regression(s) beyond {threshold:.0%} in {len(comparisons)} comparisons")
+    return regressions > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="色変換、配色判定、パレット抽出、データ変換のベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="合成データで計測して結果を保存する")
+    run_parser.add_argument("--sizes", type=int, nargs='+', default=list(DEFAULT_SIZES), help="合成データの色数")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="計測の繰り返し回数（最短時間を採用）")
+    run_parser.add_argument("--only", nargs='+', help="名前にいずれかの文字列を含むベンチマークのみを計測する")
+    run_parser.add_argument("--output", default=BENCHMARK_FILE, help="結果を保存するJSONファイル")
+    run_parser.add_argument("--baseline", help="計測後に比較するベースラインの結果ファイル")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help="性能低下とみなすスループットの低下の割合")
+    compare_parser = subparsers.add_parser("compare", help="保存した2つの結果を比較する")
+    compare_parser.add_argument("baseline", help="ベースラインの結果ファイル")
+    compare_parser.add_argument("current", help="比較する結果ファイル")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="性能低下とみなすスループットの低下の割合")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        # 先にベースラインを読み込み、同じファイルに上書きする場合も計測前の結果と比較する
+        baseline = load_results(args.baseline) if args.baseline else None
+        print(f"{'benchmark':<40} {'size':>9} {'seconds':>10} {'items/s':>14}")
+        current = run_benchmarks(args.sizes, args.repeat, args.only)
+        save_results(current, args.output)
+        print(f"Results saved to {args.output}")
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    # 性能低下があった場合は終了コード1で終了する（CIなどでの検出用）
+    if baseline is not None and print_comparisons(compare_results(baseline, current, args.threshold),
+                                                  args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import glob
+import itertools
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from scripts.common import color
+from scripts.snapshot.snapshotToPalatte import extract_palette, extract_palette_kmeans, SCREENSHOTS_DIR
+
+DEFAULT_REPEAT = 3
+
+
+def best_time(function, *args, repeat=DEFAULT_REPEAT):
+    """function を repeat 回実行し、最短の実行時間と結果を返す"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def decode_image(image_path):
+    """両方の抽出方法に共通するPNGのデコードのみを行う"""
+    return Image.open(image_path).convert('RGB').load()
+
+
+def palette_distance(palette_a, palette_b):
+    """2つのパレットの色を最も近くなるように対応付けたときの、OKLab上の平均距離 (ΔE-OK)"""
+    lab_a = color.srgb8_to_oklab(np.rint(color.hex_to_srgb_batch(palette_a) * 255), np.float64)
+    lab_b = color.srgb8_to_oklab(np.rint(color.hex_to_srgb_batch(palette_b) * 255), np.float64)
+    return min(np.linalg.norm(lab_a - lab_b[list(order)], axis=-1).mean()
+               for order in itertools.permutations(range(len(lab_b))))
+
+
+def speedup_without_decode(decode_time, kmeans_time, histogram_time):
+    """デコード時間を差し引いた抽出処理のみの速度比"""
+    return max(kmeans_time - decode_time, 0.0) / max(histogram_time - decode_time, 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KMeansとヒストグラムによるパレット抽出の速度と結果を比較する")
+    parser.add_argument("--screenshots-dir", default=SCREENSHOTS_DIR, help="スクリーンショットのディレクトリ")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="計測の繰り返し回数（最短時間を採用）")
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(os.path.join(args.screenshots_dir, "*.png")))
+    # デコード時間はどちらの方法にも含まれるため、デコードを除いた抽出処理のみの速度比も表示する
+    print(f"{'image':<45} {'decode[s]':>9} {'kmeans[s]':>9} {'hist[s]':>8} {'speedup':>7} {'w/o dec':>7} "
+          f"{'ΔE-OK':>6} {'stable':>6}")
+    totals = np.zeros(3)
+    for image_path in image_paths:
+        decode_time, _ = best_time(decode_image, image_path, repeat=args.repeat)
+        kmeans_time, kmeans_palette = best_time(extract_palette_kmeans, image_path, repeat=args.repeat)
+        histogram_time, histogram_palette = best_time(extract_palette, image_path, repeat=args.repeat)
+        stable = extract_palette(image_path) == histogram_palette  # 同じ入力で同じ結果になるか
+        totals += (decode_time, kmeans_time, histogram_time)
+        print(f"{os.path.basename(image_path):<45} {decode_time:>9.3f} {kmeans_time:>9.3f} {histogram_time:>8.3f} "
+              f"{kmeans_time / histogram_time:>7.1f} {speedup_without_decode(decode_time, kmeans_time, histogram_time):>7.1f} "
+              f"{palette_distance(kmeans_palette, histogram_palette):>6.3f} {str(stable):>6}")
+
+    if image_paths:
+        decode_time, kmeans_time, histogram_time = totals
+        print(f"{'total':<45} {decode_time:>9.3f} {kmeans_time:>9.3f} {histogram_time:>8.3f} "
+              f"{kmeans_time / histogram_time:>7.1f} {speedup_without_decode(decode_time, kmeans_time, histogram_time):>7.1f}")
+
+if __name__ == "__main__":
+    main()
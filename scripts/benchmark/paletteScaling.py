@@ -0,0 +1,52 @@
+import argparse
+import os
+import random
+import time
+from collections import deque
+
+from scripts.analyzePalette.palette import iter_color_data_lines, DEFAULT_CHUNK_SIZE
+
+# デフォルトのベンチマーク設定
+DEFAULT_PALETTE_COUNT = 100000
+DEFAULT_PALETTE_SIZE = 4
+
+
+def generate_palettes(count, palette_size=DEFAULT_PALETTE_SIZE, seed=0):
+    """ランダムなHexカラーパレットを生成する"""
+    rng = random.Random(seed)
+    return [[f'#{rng.randrange(1 << 24):06x}' for _ in range(palette_size)] for _ in range(count)]
+
+
+def measure_scaling(data, worker_counts, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ワーカー数ごとに判定と直列化（palette.py の実行時と同じ iter_color_data_lines）の処理時間を計測する"""
+    measurements = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        deque(iter_color_data_lines(data, workers=workers, chunk_size=chunk_size), maxlen=0)
+        elapsed = time.perf_counter() - start
+        measurements.append((workers, elapsed))
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パレットの判定の並列実行のスケーリングを計測する")
+    parser.add_argument("--palettes", type=int, default=DEFAULT_PALETTE_COUNT, help="生成するパレット数")
+    parser.add_argument("--palette-size", type=int, default=DEFAULT_PALETTE_SIZE, help="1パレットの色数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1つのプロセスへまとめて渡すパレット数")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="計測する最大のワーカー数")
+    args = parser.parse_args()
+
+    data = generate_palettes(args.palettes, args.palette_size)
+    worker_counts = sorted({1, *[2 ** i for i in range(1, args.max_workers.bit_length())], args.max_workers})
+
+    print(f"palettes={args.palettes} palette_size={args.palette_size} chunk_size={args.chunk_size}")
+    print(f"{'workers':>7} {'seconds':>9} {'palettes/s':>11} {'speedup':>8} {'efficiency':>10}")
+    measurements = measure_scaling(data, worker_counts, args.chunk_size)
+    baseline = measurements[0][1]
+    for workers, elapsed in measurements:
+        speedup = baseline / elapsed
+        print(f"{workers:>7} {elapsed:>9.3f} {args.palettes / elapsed:>11.0f} {speedup:>8.2f} {speedup / workers:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
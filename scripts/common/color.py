@@ -1,103 +1,470 @@
+from collections import OrderedDict
+from typing import NamedTuple
+
 import numpy as np
 
-class Hex:
-    def __init__(self, hex_value: str):
-        self.hex_value = hex_value
+# sRGB -> LMS
+SRGB_TO_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005]
+])
 
-    def to_srgb(self):
-        hex_value = self.hex_value.lstrip('#')
-        r, g, b = tuple(int(hex_value[i:i + 2], 16) / 255 for i in (0, 2, 4))
-        return Srgb(r, g, b)
+# LMS' -> OKLab
+LMS_TO_OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660]
+])
 
-    def to_oklab(self):
-        return self.to_srgb().to_oklab()
+# OKLab -> LMS'
+OKLAB_TO_LMS = np.array([
+    [1.0, 0.3963377774, 0.2158037573],
+    [1.0, -0.1055613458, -0.0638541728],
+    [1.0, -0.0894841775, -1.2914855480]
+])
+
+# LMS -> sRGB
+LMS_TO_SRGB = np.array([
+    [4.0767416621, -3.3077115913, 0.2309699292],
+    [-1.2684380046, 2.6097574011, -0.3413193965],
+    [-0.0041960863, -0.7034186147, 1.7076147010]
+])
+
+
+# 配列単位の変換関数
+# 入力・出力ともに (..., 3) の配列で、最後の軸が色の3成分を表す
+def apply_matrix(matrix, values) -> np.ndarray:
+    """(..., 3) の各色に3x3行列を掛ける"""
+    # matmul (BLAS) は配列の大きさによって丸めが変わるため、einsum で1色ずつの matrix.dot と同じ結果にする
+    return np.einsum('ij,...j->...i', matrix, values)
+
+
+def hex_to_rgb24(hex_value: str) -> int:
+    """Hex文字列を24bitのRGB整数 (0xRRGGBB) に変換する"""
+    return int(hex_value.lstrip('#')[:6], 16)
 
-    def to_oklch(self):
-        return self.to_srgb().to_oklch()
 
-    def to_hsl(self):
-        return self.to_srgb().to_hsl()
+def hex_to_rgb24_batch(hex_values) -> np.ndarray:
+    """Hex文字列のシーケンスを (N,) の24bitのRGB整数の配列に変換する"""
+    return np.array([int(hex_value.lstrip('#')[:6], 16) for hex_value in hex_values], dtype=np.int64)
+
+
+def rgb24_to_srgb_batch(packed) -> np.ndarray:
+    """24bitのRGB整数の配列を (N, 3) のsRGB配列に変換する"""
+    packed = np.asarray(packed, dtype=np.int64)
+    channels = np.stack([packed >> 16, (packed >> 8) & 0xFF, packed & 0xFF], axis=-1)
+    return channels / 255
 
-class Srgb:
-    def __init__(self, r: float, g: float, b: float):
-        self.r = r
-        self.g = g
-        self.b = b
 
-    def to_hex(self):
-        r, g, b = self.r, self.g, self.b
-        return Hex(f'#{int(r * 255):02x}{int(g * 255):02x}{int(b * 255):02x}')
+def hex_to_srgb_batch(hex_values) -> np.ndarray:
+    """Hex文字列のシーケンスを (N, 3) のsRGB配列に変換する"""
+    return rgb24_to_srgb_batch(hex_to_rgb24_batch(hex_values))
 
-    def to_hsl(self):
-        r, g, b = self.r, self.g, self.b
-        max_val = max(r, g, b)
-        min_val = min(r, g, b)
-        l = (max_val + min_val) / 2
 
-        if max_val == min_val:
-            h = s = 0.0  # 無彩色
-        else:
-            d = max_val - min_val
-            s = d / (1 - abs(2 * l - 1)) if l != 0 else 0
+def srgb_to_hex_batch(rgb) -> list[str]:
+    """(N, 3) のsRGB配列をHex文字列のリストに変換する（範囲外の値は0-255に切り詰める）"""
+    channels = np.clip(np.trunc(np.asarray(rgb, dtype=float) * 255), 0, 255).astype(np.int64).reshape(-1, 3)
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in channels.tolist()]
+
+
+def srgb_to_hsl_batch(rgb) -> np.ndarray:
+    """sRGB配列をHSL配列 (h: 0-360, s: 0-1, l: 0-1) に変換する"""
+    rgb = np.asarray(rgb, dtype=float)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    max_val = np.max(rgb, axis=-1)
+    min_val = np.min(rgb, axis=-1)
+    l = (max_val + min_val) / 2
+
+    chromatic = max_val != min_val  # 無彩色以外
+    d = np.where(chromatic, max_val - min_val, 1.0)
+    saturated = chromatic & (l != 0)
+    s = np.where(saturated, d / np.where(saturated, 1 - np.abs(2 * l - 1), 1.0), 0.0)
+
+    h = np.where(max_val == r, (g - b) / d + np.where(g < b, 6, 0),
+                 np.where(max_val == g, (b - r) / d + 2, (r - g) / d + 4)) * 60
+    h = np.where(chromatic, h, 0.0)
+
+    return np.stack([h, s, l], axis=-1)
+
+
+def hsl_to_srgb_batch(hsl) -> np.ndarray:
+    """HSL配列をsRGB配列に変換する"""
+    hsl = np.asarray(hsl, dtype=float)
+    h, s, l = hsl[..., 0], hsl[..., 1], hsl[..., 2]
+    c_val = (1 - np.abs(2 * l - 1)) * s
+    x = c_val * (1 - np.abs((h / 60) % 2 - 1))
+    m = l - c_val / 2
+    zero = np.zeros_like(c_val)
+
+    # 色相の区間ごとに (r, g, b) の並びを選択
+    conditions = [(0 <= h) & (h < 60), (60 <= h) & (h < 120), (120 <= h) & (h < 180),
+                  (180 <= h) & (h < 240), (240 <= h) & (h < 300)]
+    r = np.select(conditions, [c_val, x, zero, zero, x], c_val)
+    g = np.select(conditions, [x, c_val, c_val, x, zero], zero)
+    b = np.select(conditions, [zero, zero, x, c_val, c_val], x)
+
+    return np.stack([r + m, g + m, b + m], axis=-1)
+
+
+def srgb_to_oklab_batch(rgb) -> np.ndarray:
+    """
+    sRGB配列をOKLab配列に変換する。
+    既存の結果との互換性のため線形化（ガンマ補正の解除）を行わない。
+    正しい変換が必要な場合は linear_srgb_to_oklab_batch / srgb8_to_oklab を使う。
+    """
+    lms = apply_matrix(SRGB_TO_LMS, np.asarray(rgb, dtype=float))
+    lms_ = np.cbrt(np.where(lms > 0, lms, -lms)) * np.sign(lms)
+    return apply_matrix(LMS_TO_OKLAB, lms_)
+
+
+def oklab_to_srgb_batch(oklab) -> np.ndarray:
+    """OKLab配列をsRGB配列に変換する（ガマット外の値もそのまま返す）"""
+    lms_ = apply_matrix(OKLAB_TO_LMS, np.asarray(oklab, dtype=float))
+    lms = lms_ ** 3
+    return apply_matrix(LMS_TO_SRGB, lms)
+
+
+def oklab_to_oklch_batch(oklab) -> np.ndarray:
+    """OKLab配列をOKLCH配列 (H: 0-360度) に変換する"""
+    oklab = np.asarray(oklab, dtype=float)
+    L, a, b = oklab[..., 0], oklab[..., 1], oklab[..., 2]
+    # np.float64 の ** 2 (pow) と同じ丸めになるよう float_power を使う
+    C = np.sqrt(np.float_power(a, 2) + np.float_power(b, 2))
+    H = np.degrees(np.arctan2(b, a))
+    H = np.where(H < 0, H + 360, H)
+    return np.stack([L, C, H], axis=-1)
+
+
+def oklch_to_oklab_batch(oklch) -> np.ndarray:
+    """OKLCH配列 (H: 0-360度) をOKLab配列に変換する"""
+    oklch = np.asarray(oklch, dtype=float)
+    L, C, H = oklch[..., 0], oklch[..., 1], oklch[..., 2]
+    a = C * np.cos(np.radians(H))
+    b = C * np.sin(np.radians(H))
+    return np.stack([L, a, b], axis=-1)
+
+
+def hex_to_hsl_batch(hex_values, cache=None) -> np.ndarray:
+    if cache is not None:
+        return cache.convert(hex_values, 'hsl')
+    return srgb_to_hsl_batch(hex_to_srgb_batch(hex_values))
+
+
+def hex_to_oklab_batch(hex_values, cache=None) -> np.ndarray:
+    if cache is not None:
+        return cache.convert(hex_values, 'oklab')
+    return srgb_to_oklab_batch(hex_to_srgb_batch(hex_values))
+
+
+def hex_to_oklch_batch(hex_values, cache=None) -> np.ndarray:
+    if cache is not None:
+        return cache.convert(hex_values, 'oklch')
+    return oklab_to_oklch_batch(hex_to_oklab_batch(hex_values))
+
+
+def srgb_to_oklch_batch(rgb) -> np.ndarray:
+    return oklab_to_oklch_batch(srgb_to_oklab_batch(rgb))
+
+
+def oklch_to_srgb_batch(oklch) -> np.ndarray:
+    return oklab_to_srgb_batch(oklch_to_oklab_batch(oklch))
+
+
+# ガマットマッピング
+# sRGBの範囲外になるOKLCHの色を、L と H を保ったまま C（彩度）を下げてsRGBの範囲内に収める
+# sRGBの各チャンネルが [-GAMUT_TOLERANCE, 1 + GAMUT_TOLERANCE] ならガマット内とみなす（範囲外の分は最後に切り詰める）。
+# OKLAB_TO_LMS / LMS_TO_SRGB の往復の丸め誤差（24bitの全ての色で最大約 1.3e-7）より十分大きくし、
+# ガマット内の色が誤差だけでガマットマッピングされて値が変わらないようにする
+GAMUT_TOLERANCE = 1e-6
+CHROMA_PRECISION = 1e-6  # 二分探索で求める彩度の精度
+
+
+def in_srgb_gamut_batch(rgb, tolerance=GAMUT_TOLERANCE) -> np.ndarray:
+    """sRGB配列 (..., 3) の各色がガマット内か"""
+    rgb = np.asarray(rgb, dtype=float)
+    return np.all((rgb >= -tolerance) & (rgb <= 1 + tolerance), axis=-1)
+
+
+def max_chroma_bisect_batch(L, H, C_max, precision=CHROMA_PRECISION) -> np.ndarray:
+    """
+    L と H を固定し、0 から C_max の間でガマット内に収まる最大の彩度を二分探索で求める（全要素を同時に探索する）。
+    結果は必ずガマット内で、真の最大値との差は precision 以下。
+    """
+    L, H = np.asarray(L, dtype=float), np.asarray(H, dtype=float)
+    low = np.zeros(np.shape(C_max))
+    high = np.abs(np.asarray(C_max, dtype=float))
+    if high.size == 0:
+        return low
+    iterations = max(int(np.ceil(np.log2(max(high.max(), precision) / precision))), 0)
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        inside = in_srgb_gamut_batch(oklch_to_srgb_batch(np.stack([L, middle, H], axis=-1)))
+        low = np.where(inside, middle, low)
+        high = np.where(inside, high, middle)
+    return low
+
+
+def gamut_map_oklch_batch(oklch, precision=CHROMA_PRECISION) -> np.ndarray:
+    """
+    OKLCH配列 (..., 3) のうちガマット外の色の彩度を下げてsRGBのガマット内に収める。
+    L は 0-1 に切り詰め、H はそのまま保つ。ガマット内の色は変更しない。
+    """
+    oklch = np.array(oklch, dtype=float)
+    outside = ~in_srgb_gamut_batch(oklch_to_srgb_batch(oklch))
+    if outside.any():
+        target = oklch[outside]
+        target[:, 0] = np.clip(target[:, 0], 0, 1)
+        target[:, 1] = max_chroma_bisect_batch(target[:, 0], target[:, 2], target[:, 1], precision)
+        oklch[outside] = target
+    return oklch
+
+
+def oklch_to_srgb_gamut_batch(oklch, precision=CHROMA_PRECISION) -> np.ndarray:
+    """
+    OKLCH配列をガマットマッピングしてsRGB配列 (0-1) に変換する。
+    ガマット内の色は oklch_to_srgb_batch と同じ値になる（最後に許容誤差分を0-1に切り詰める）。
+    """
+    oklch = np.asarray(oklch, dtype=float)
+    rgb = oklch_to_srgb_batch(oklch)
+    outside = ~in_srgb_gamut_batch(rgb)
+    if outside.any():
+        rgb[outside] = oklch_to_srgb_batch(gamut_map_oklch_batch(oklch[outside], precision))
+    return np.clip(rgb, 0, 1)
+
+
+def oklab_to_srgb_gamut_batch(oklab, precision=CHROMA_PRECISION) -> np.ndarray:
+    """OKLab配列をガマットマッピングしてsRGB配列 (0-1) に変換する（ガマット内の色は oklab_to_srgb_batch と同じ値）"""
+    oklab = np.asarray(oklab, dtype=float)
+    rgb = oklab_to_srgb_batch(oklab)
+    outside = ~in_srgb_gamut_batch(rgb)
+    if outside.any():
+        rgb[outside] = oklch_to_srgb_batch(gamut_map_oklch_batch(oklab_to_oklch_batch(oklab[outside]), precision))
+    return np.clip(rgb, 0, 1)
+
 
-            if max_val == r:
-                h = (g - b) / d + (6 if g < b else 0)
-            elif max_val == g:
-                h = (b - r) / d + 2
-            else:
-                h = (r - g) / d + 4
+# sRGBの伝達関数（ガンマ）と線形sRGBを経由した正しいOKLab変換
+def srgb_to_linear_batch(rgb) -> np.ndarray:
+    """sRGB (0-1) 配列を線形sRGB配列に変換する"""
+    rgb = np.asarray(rgb, dtype=float)
+    magnitude = np.abs(rgb)
+    return np.where(magnitude <= 0.04045, rgb / 12.92, np.sign(rgb) * ((magnitude + 0.055) / 1.055) ** 2.4)
 
-            h *= 60
 
-        return Hsl(h, s, l)
+def linear_to_srgb_batch(linear) -> np.ndarray:
+    """線形sRGB配列をsRGB (0-1) 配列に変換する"""
+    linear = np.asarray(linear, dtype=float)
+    magnitude = np.abs(linear)
+    return np.where(magnitude <= 0.0031308, linear * 12.92, np.sign(linear) * (1.055 * magnitude ** (1 / 2.4) - 0.055))
+
+
+def linear_srgb_to_oklab_batch(linear) -> np.ndarray:
+    """線形sRGB配列をOKLab配列に変換する（入力のdtypeのまま計算する）"""
+    linear = np.asarray(linear)
+    lms = apply_matrix(SRGB_TO_LMS.astype(linear.dtype), linear)
+    return apply_matrix(LMS_TO_OKLAB.astype(linear.dtype), np.cbrt(lms))
+
+
+def oklab_to_linear_srgb_batch(oklab) -> np.ndarray:
+    """OKLab配列を線形sRGB配列に変換する（入力のdtypeのまま計算する）"""
+    oklab = np.asarray(oklab)
+    lms_ = apply_matrix(OKLAB_TO_LMS.astype(oklab.dtype), oklab)
+    return apply_matrix(LMS_TO_SRGB.astype(oklab.dtype), lms_ ** 3)
+
+
+# CIELAB (D65) への変換（CIEDE2000 の計算に使う）
+LINEAR_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+CIELAB_EPSILON = (6 / 29) ** 3
+
+
+def linear_srgb_to_cielab_batch(linear) -> np.ndarray:
+    """線形sRGB配列をCIELAB配列 (L: 0-100) に変換する"""
+    xyz = apply_matrix(LINEAR_SRGB_TO_XYZ, np.asarray(linear, dtype=float)) / D65_WHITE
+    f = np.where(xyz > CIELAB_EPSILON, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def srgb_to_cielab_batch(rgb) -> np.ndarray:
+    """sRGB (0-1) 配列を線形化してCIELAB配列に変換する"""
+    return linear_srgb_to_cielab_batch(srgb_to_linear_batch(rgb))
+
+
+# 8bit (uint8) 入力の高速パス
+# スクリーンショットのピクセルなど大量の8bit値を、256要素のルックアップテーブルで線形化する
+SRGB8_TO_LINEAR = srgb_to_linear_batch(np.arange(256) / 255)
+
+# 線形sRGBから8bit値への逆変換用のしきい値（隣り合う8bit値の中間点を線形化した255要素）
+LINEAR_TO_SRGB8_THRESHOLDS = srgb_to_linear_batch((np.arange(255) + 0.5) / 255)
+
+
+def srgb8_to_linear(pixels, dtype=np.float32) -> np.ndarray:
+    """uint8 のsRGB配列をテーブル参照で線形sRGB配列に変換する"""
+    return SRGB8_TO_LINEAR.astype(dtype)[np.asarray(pixels, dtype=np.uint8)]
+
+
+def linear_to_srgb8(linear) -> np.ndarray:
+    """線形sRGB配列をテーブル参照で最も近い uint8 のsRGB値に変換する（範囲外の値は0-255に収まる）"""
+    return np.searchsorted(LINEAR_TO_SRGB8_THRESHOLDS, linear, side='right').astype(np.uint8)
+
+
+def srgb8_to_oklab(pixels, dtype=np.float32) -> np.ndarray:
+    """uint8 のsRGB配列 (..., 3) を線形化してOKLab配列に変換する"""
+    return linear_srgb_to_oklab_batch(srgb8_to_linear(pixels, dtype))
+
+
+def oklab_to_srgb8(oklab) -> np.ndarray:
+    """OKLab配列を uint8 のsRGB配列に変換する（ガマット外の値は各チャンネルで切り詰める）"""
+    return linear_to_srgb8(np.clip(oklab_to_linear_srgb_batch(oklab), 0, 1))
+
+
+# 変換キャッシュ
+DEFAULT_CACHE_SIZE = 16384  # 色空間ごとにキャッシュに保持する色数の上限
+
+# キャッシュする色空間と、sRGB配列からの変換関数
+CACHE_CONVERTERS = {
+    'srgb': lambda srgb: srgb,
+    'hsl': srgb_to_hsl_batch,
+    'oklab': srgb_to_oklab_batch,
+    'oklch': srgb_to_oklch_batch,
+}
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ConversionCache:
+    """
+    24bitのRGB整数をキーに、sRGB・HSL・OKLab・OKLCHへの変換結果を色空間ごとにLRU方式で保持するキャッシュ。
+    Hexクラスのメソッドと hex_to_*_batch(..., cache=...) の両方から使う。
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, OrderedDict[int, tuple]] = {space: OrderedDict() for space in CACHE_CONVERTERS}
+
+    def lookup(self, hex_value: str, space: str) -> tuple:
+        """1色を指定した色空間 ('srgb', 'hsl', 'oklab', 'oklch') に変換した3つの値を返す"""
+        entries = self._entries[space]
+        key = hex_to_rgb24(hex_value)
+        entry = entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = tuple(CACHE_CONVERTERS[space](rgb24_to_srgb_batch([key]))[0].tolist())
+        self._store(entries, key, entry)
+        return entry
+
+    def convert(self, hex_values, space: str) -> np.ndarray:
+        """Hex文字列のシーケンスを指定した色空間の (N, 3) 配列に変換する（キャッシュにない色だけをまとめて計算する）"""
+        entries = self._entries[space]
+        keys, inverse = np.unique(hex_to_rgb24_batch(hex_values), return_inverse=True)
+        keys = keys.tolist()
+        values = [entries.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+
+        for key, value in zip(keys, values):
+            if value is not None:
+                entries.move_to_end(key)
+        if missing:
+            computed = CACHE_CONVERTERS[space](rgb24_to_srgb_batch([keys[i] for i in missing])).tolist()
+            for i, value in zip(missing, computed):
+                values[i] = tuple(value)
+                self._store(entries, keys[i], values[i])
+
+        self.misses += len(missing)
+        self.hits += len(inverse) - len(missing)
+        return np.array(values, dtype=float).reshape(-1, 3)[inverse.reshape(-1)]
+
+    def resize(self, maxsize: int):
+        """キャッシュの上限を変更し、超えた分を古いものから削除する"""
+        self.maxsize = maxsize
+        for entries in self._entries.values():
+            while len(entries) > max(maxsize, 0):
+                entries.popitem(last=False)
+
+    def clear(self):
+        for entries in self._entries.values():
+            entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, sum(len(entries) for entries in self._entries.values()))
+
+    def _store(self, entries: OrderedDict, key: int, entry: tuple):
+        if self.maxsize <= 0:
+            return
+        entries[key] = entry
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+
+# Hexクラスなどが共有するキャッシュ（サイズは conversion_cache.resize で変更できる）
+conversion_cache = ConversionCache()
+
+
+def colors_from_array(color_type, values) -> list:
+    """配列（HexならHex文字列のシーケンス）から色オブジェクトのリストを一括生成する"""
+    if color_type is Hex:
+        return list(map(Hex, values))
+    return list(map(color_type._make, np.asarray(values, dtype=float).tolist()))
+
+
+# 色の値オブジェクト
+# NamedTupleにすることでインスタンスごとの__dict__を持たず、不変かつ軽量に保つ
+class Hex(NamedTuple):
+    hex_value: str
+
+    def to_srgb(self):
+        return Srgb(*conversion_cache.lookup(self.hex_value, 'srgb'))
 
     def to_oklab(self):
-        rgb = np.array([self.r, self.g, self.b])
-        lms = np.array([
-            [0.4122214708, 0.5363325363, 0.0514459929],
-            [0.2119034982, 0.6806995451, 0.1073969566],
-            [0.0883024619, 0.2817188376, 0.6299787005]
-        ]).dot(rgb)
+        return Oklab(*conversion_cache.lookup(self.hex_value, 'oklab'))
 
-        lms_ = np.cbrt(np.where(lms > 0, lms, -lms)) * np.sign(lms)
+    def to_oklch(self):
+        return Oklch(*conversion_cache.lookup(self.hex_value, 'oklch'))
 
-        oklab = np.array([
-            [0.2104542553, 0.7936177850, -0.0040720468],
-            [1.9779984951, -2.4285922050, 0.4505937099],
-            [0.0259040371, 0.7827717662, -0.8086757660]
-        ]).dot(lms_)
+    def to_hsl(self):
+        return Hsl(*conversion_cache.lookup(self.hex_value, 'hsl'))
 
-        return Oklab(*oklab)
+class Srgb(NamedTuple):
+    r: float
+    g: float
+    b: float
+
+    def to_hex(self):
+        return Hex(srgb_to_hex_batch(self)[0])
+
+    def to_hsl(self):
+        return Hsl(*srgb_to_hsl_batch(self).tolist())
+
+    def to_oklab(self):
+        return Oklab(*srgb_to_oklab_batch(self).tolist())
 
     def to_oklch(self):
         return self.to_oklab().to_oklch()
 
-class Hsl:
-    def __init__(self, h: float, s: float, l: float):
-        self.h = h
-        self.s = s
-        self.l = l
+class Hsl(NamedTuple):
+    h: float
+    s: float
+    l: float
 
     def to_srgb(self):
-        h, s, l = self.h, self.s, self.l
-        c_val = (1 - abs(2 * l - 1)) * s
-        x = c_val * (1 - abs((h / 60) % 2 - 1))
-        m = l - c_val / 2
-
-        if 0 <= h < 60:
-            r, g, b = c_val, x, 0
-        elif 60 <= h < 120:
-            r, g, b = x, c_val, 0
-        elif 120 <= h < 180:
-            r, g, b = 0, c_val, x
-        elif 180 <= h < 240:
-            r, g, b = 0, x, c_val
-        elif 240 <= h < 300:
-            r, g, b = x, 0, c_val
-        else:
-            r, g, b = c_val, 0, x
-
-        return Srgb(r + m, g + m, b + m)
+        return Srgb(*hsl_to_srgb_batch(self).tolist())
 
     def to_hex(self):
         return self.to_srgb().to_hex()
@@ -108,22 +475,18 @@ class Hsl:
     def to_oklch(self):
         return self.to_srgb().to_oklch()
 
-class Oklch:
-    def __init__(self, L: float, C: float, H: float):
-        self.L = L
-        self.C = C
-        self.H = H
+class Oklch(NamedTuple):
+    L: float
+    C: float
+    H: float
 
     def to_oklab(self):
         """OKLCHからOKLabに変換するメソッド"""
-        L = self.L
-        a = self.C * np.cos(np.radians(self.H))
-        b = self.C * np.sin(np.radians(self.H))
-        return Oklab(L, a, b)
+        return Oklab(*oklch_to_oklab_batch(self).tolist())
 
     def to_srgb(self):
-        """OKLCHからsRGBに変換するメソッド"""
-        return self.to_oklab().to_srgb()
+        """OKLCHからsRGBに変換するメソッド（ガマット外の色は L と H を保って彩度を下げる）"""
+        return Srgb(*oklch_to_srgb_gamut_batch(self).tolist())
 
     def to_hex(self):
         """OKLCHからHex色に変換するメソッド"""
@@ -133,37 +496,17 @@ class Oklch:
         """OKLCHからHSLに変換するメソッド"""
         return self.to_srgb().to_hsl()
 
-class Oklab:
-    def __init__(self, L: float, a: float, b: float):
-        self.L = L
-        self.a = a
-        self.b = b
+class Oklab(NamedTuple):
+    L: float
+    a: float
+    b: float
 
     def to_oklch(self):
-        L = self.L
-        C = np.sqrt(self.a ** 2 + self.b ** 2)
-        H = np.degrees(np.arctan2(self.b, self.a))
-        if H < 0:
-            H += 360
-        return Oklch(L, C, H)
+        return Oklch(*oklab_to_oklch_batch(self).tolist())
 
     def to_srgb(self):
-        oklab = np.array([self.L, self.a, self.b])
-        lms_ = np.array([
-            [1.0, 0.3963377774, 0.2158037573],
-            [1.0, -0.1055613458, -0.0638541728],
-            [1.0, -0.0894841775, -1.2914855480]
-        ]).dot(oklab)
-
-        lms = lms_ ** 3
-
-        rgb = np.array([
-            [4.0767416621, -3.3077115913, 0.2309699292],
-            [-1.2684380046, 2.6097574011, -0.3413193965],
-            [-0.0041960863, -0.7034186147, 1.7076147010]
-        ]).dot(lms)
-
-        return Srgb(*rgb)
+        """ガマット外の色は L と H を保って彩度を下げる"""
+        return Srgb(*oklab_to_srgb_gamut_batch(self).tolist())
 
     def to_hex(self):
         return self.to_srgb().to_hex()
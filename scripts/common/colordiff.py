@@ -0,0 +1,175 @@
+import numpy as np
+
+from scripts.common import color
+
+# 距離行列を計算する際の1ブロックあたりの色の組の数。
+# 中間配列の大きさがこの数に比例するため、色数に関わらずメモリ使用量は一定になる
+DEFAULT_BLOCK_SIZE = 1 << 18
+
+
+def delta_e_ok(oklab1, oklab2) -> np.ndarray:
+    """OKLab配列 (..., 3) 同士のユークリッド距離 (ΔE-OK)。形状はブロードキャストされる"""
+    difference = np.asarray(oklab1, dtype=float) - np.asarray(oklab2, dtype=float)
+    return np.sqrt(np.einsum('...i,...i->...', difference, difference))
+
+
+def hue_distance(hue1, hue2) -> np.ndarray:
+    """色相 (0-360度) 同士の円周上の距離 (0-180度)"""
+    difference = np.mod(np.asarray(hue1, dtype=float) - np.asarray(hue2, dtype=float), 360)
+    return np.minimum(difference, 360 - difference)
+
+
+def delta_e_oklch(oklch1, oklch2) -> np.ndarray:
+    """
+    OKLCH配列 (..., 3、H は度) 同士の色差。色相の差は円周上で取り、彩度で重み付けした
+    ΔH = 2 * sqrt(C1 * C2) * sin(Δh / 2) として L, C と合わせる。
+    OKLabに変換してから delta_e_ok を計算したものと（丸め誤差を除いて）一致する。
+    """
+    oklch1, oklch2 = np.asarray(oklch1, dtype=float), np.asarray(oklch2, dtype=float)
+    delta_L = oklch1[..., 0] - oklch2[..., 0]
+    delta_C = oklch1[..., 1] - oklch2[..., 1]
+    delta_H = 2 * np.sqrt(oklch1[..., 1] * oklch2[..., 1]) * np.sin(np.radians(oklch1[..., 2] - oklch2[..., 2]) / 2)
+    return np.sqrt(delta_L * delta_L + delta_C * delta_C + delta_H * delta_H)
+
+
+def delta_e_2000(lab1, lab2, kL=1.0, kC=1.0, kH=1.0) -> np.ndarray:
+    """CIELAB配列 (..., 3、L: 0-100) 同士のCIEDE2000色差（Sharma et al. 2005 の式）"""
+    lab1, lab2 = np.asarray(lab1, dtype=float), np.asarray(lab2, dtype=float)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    # a軸の補正
+    C_bar7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    G = 0.5 * (1 - np.sqrt(C_bar7 / (C_bar7 + 25.0 ** 7)))
+    a1, a2 = (1 + G) * a1, (1 + G) * a2
+    C1, C2 = np.hypot(a1, b1), np.hypot(a2, b2)
+    h1 = np.mod(np.degrees(np.arctan2(b1, a1)), 360)
+    h2 = np.mod(np.degrees(np.arctan2(b2, a2)), 360)
+    achromatic = C1 * C2 == 0
+
+    # 差
+    delta_L = L2 - L1
+    delta_C = C2 - C1
+    delta_h = h2 - h1
+    delta_h = np.where(delta_h > 180, delta_h - 360, np.where(delta_h < -180, delta_h + 360, delta_h))
+    delta_h = np.where(achromatic, 0, delta_h)
+    delta_H = 2 * np.sqrt(C1 * C2) * np.sin(np.radians(delta_h) / 2)
+
+    # 平均
+    L_mean = (L1 + L2) / 2
+    C_mean = (C1 + C2) / 2
+    h_sum = h1 + h2
+    h_mean = np.where(np.abs(h1 - h2) <= 180, h_sum / 2, np.where(h_sum < 360, h_sum + 360, h_sum - 360) / 2)
+    h_mean = np.where(achromatic, h_sum, h_mean)
+
+    # 重み付け
+    T = (1 - 0.17 * np.cos(np.radians(h_mean - 30)) + 0.24 * np.cos(np.radians(2 * h_mean))
+         + 0.32 * np.cos(np.radians(3 * h_mean + 6)) - 0.20 * np.cos(np.radians(4 * h_mean - 63)))
+    L_offset = (L_mean - 50) ** 2
+    S_L = 1 + 0.015 * L_offset / np.sqrt(20 + L_offset)
+    S_C = 1 + 0.045 * C_mean
+    S_H = 1 + 0.015 * C_mean * T
+    C_mean7 = C_mean ** 7
+    R_C = 2 * np.sqrt(C_mean7 / (C_mean7 + 25.0 ** 7))
+    R_T = -np.sin(np.radians(60 * np.exp(-(((h_mean - 275) / 25) ** 2)))) * R_C
+
+    term_L = delta_L / (kL * S_L)
+    term_C = delta_C / (kC * S_C)
+    term_H = delta_H / (kH * S_H)
+    return np.sqrt(term_L * term_L + term_C * term_C + term_H * term_H + R_T * term_C * term_H)
+
+
+# 距離の種類ごとの (色差の関数, 入力の色空間)
+METRICS = {
+    "oklab": (delta_e_ok, "oklab"),
+    "oklch": (delta_e_oklch, "oklch"),
+    "ciede2000": (delta_e_2000, "cielab"),
+    "hue": (lambda oklch1, oklch2: hue_distance(oklch1[..., 2], oklch2[..., 2]), "oklch"),
+}
+
+# sRGB (0-1) から各距離の入力の色空間への変換（OKLab / OKLCH は線形化したsRGBから変換する）
+SRGB_CONVERTERS = {
+    "oklab": lambda rgb: color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(rgb)),
+    "oklch": lambda rgb: color.oklab_to_oklch_batch(
+        color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(rgb))),
+    "cielab": color.srgb_to_cielab_batch,
+}
+
+
+def metric_function(metric):
+    """距離の名前（METRICS のキー）または関数から色差の関数を返す"""
+    if callable(metric):
+        return metric
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric} (expected one of {', '.join(METRICS)})")
+    return METRICS[metric][0]
+
+
+def srgb_to_metric_space(rgb, metric) -> np.ndarray:
+    """sRGB (0-1) 配列を、距離 metric の入力の色空間に変換する"""
+    return SRGB_CONVERTERS[METRICS[metric][1]](rgb)
+
+
+def block_rows(columns, block_size=DEFAULT_BLOCK_SIZE) -> int:
+    """列数が columns の距離行列を、1ブロックが block_size 組以下になるように分けたときの行数"""
+    return max(1, block_size // max(columns, 1))
+
+
+def iter_distance_blocks(colors1, colors2, metric="oklab", block_size=DEFAULT_BLOCK_SIZE):
+    """
+    colors1 (N, 3) と colors2 (M, 3) の距離行列を、行ごとのブロック (開始行, (行数, M) の距離) として順に返す。
+    行列全体をメモリに保持しない集計（最近傍の検索やしきい値以下の組の抽出など）に使う。
+    """
+    distance = metric_function(metric)
+    colors1, colors2 = np.asarray(colors1, dtype=float), np.asarray(colors2, dtype=float)
+    rows = block_rows(len(colors2), block_size)
+    for start in range(0, len(colors1), rows):
+        yield start, distance(colors1[start:start + rows, None], colors2[None])
+
+
+def cross_distances(colors1, colors2, metric="oklab", block_size=DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """colors1 (N, 3) と colors2 (M, 3) の全ての組の距離 (N, M) をブロックごとに計算する"""
+    result = np.empty((len(colors1), len(colors2)))
+    for start, block in iter_distance_blocks(colors1, colors2, metric, block_size):
+        result[start:start + len(block)] = block
+    return result
+
+
+def pairwise_distances(colors, metric="oklab", block_size=DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """
+    colors (N, 3) の全ての組の距離 (N, N) をブロックごとに計算する。
+    距離は対称なので、各行ブロックでは対角ブロックから右側のみを計算し、左下には転置したものを書き込む。
+    """
+    distance = metric_function(metric)
+    colors = np.asarray(colors, dtype=float)
+    count = len(colors)
+    result = np.empty((count, count))
+    rows = block_rows(count, block_size)
+    for start in range(0, count, rows):
+        stop = min(start + rows, count)
+        block = distance(colors[start:stop, None], colors[None, start:])
+        result[start:stop, start:] = block
+        result[start:, start:stop] = block.T
+    np.fill_diagonal(result, 0)
+    return result
+
+
+def nearest_colors(queries, candidates, metric="oklab", k=1,
+                   block_size=DEFAULT_BLOCK_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    queries (N, 3) の各色に最も近い candidates (M, 3) の k 色を、ブロックごとに距離の昇順で求める。
+
+    Returns:
+    (np.ndarray, np.ndarray): (N, k) の距離とインデックス
+    """
+    k = min(k, len(candidates))
+    distances = np.empty((len(queries), k))
+    indices = np.empty((len(queries), k), dtype=np.intp)
+    for start, block in iter_distance_blocks(queries, candidates, metric, block_size):
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k] if k < block.shape[1] else \
+            np.broadcast_to(np.arange(block.shape[1]), block.shape)
+        nearest_distances = np.take_along_axis(block, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind='stable')
+        distances[start:start + len(block)] = np.take_along_axis(nearest_distances, order, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(nearest, order, axis=1)
+    return distances, indices
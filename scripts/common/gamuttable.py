@@ -0,0 +1,208 @@
+import argparse
+import functools
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from scripts.common import color
+
+# (L, H) の格子点ごとのsRGBガマット内の最大彩度の表
+TABLE_FILE = "../../data/processed/gamut_table.npz"
+TABLE_VERSION = 2  # 保存形式や作り方を変えた場合に増やす（古いファイルは作り直される）
+LIGHTNESS_STEPS = 256  # L (0-1) の分割数（格子点は LIGHTNESS_STEPS + 1 個）
+HUE_STEPS = 720  # H (0-360度) の分割数（0.5度刻み。360度の列は0度の列と同じ値）
+MAX_CHROMA = 0.5  # 最大彩度を探す範囲の上限（sRGBの最大彩度は約0.32）
+# セルの中心での補間誤差がこれを超えるセルと、その隣のセルでは表を使わずに最大彩度を直接求める
+EXACT_CELL_ERROR = 1e-4
+# max_chroma の誤差の上限（gamuttable_test.py で確かめる）。
+# 直接求めないセルの内部では中心以外で EXACT_CELL_ERROR を少し超えることがあるため余裕を持たせる
+MAX_ERROR = 2e-4
+EXACT_CHUNK_SIZE = 1 << 16  # 最大彩度を直接求める場合に一度に計算する点の数
+
+
+def channel_polynomials(L, H) -> np.ndarray:
+    """
+    L と H を固定した半直線上で、RGBの各チャンネルを彩度 C の3次式で表した係数 (..., 3, 4)（C^3, C^2, C, 1 の順）。
+    OKLabからLMS'への変換は C について1次式で、LMS'を3乗してからRGBに線形変換するため3次式になる
+    """
+    L, H = np.asarray(L, dtype=float), np.radians(np.asarray(H, dtype=float))
+    offset = L[..., None] * color.OKLAB_TO_LMS[:, 0]
+    slope = np.cos(H)[..., None] * color.OKLAB_TO_LMS[:, 1] + np.sin(H)[..., None] * color.OKLAB_TO_LMS[:, 2]
+    cubes = np.stack([slope ** 3, 3 * offset * slope ** 2, 3 * offset ** 2 * slope, offset ** 3], axis=-1)
+    return np.einsum('km,...mp->...kp', color.LMS_TO_SRGB, cubes)
+
+
+def _exact_max_chroma_flat(L, H) -> np.ndarray:
+    polynomials = channel_polynomials(L, H)  # (n, 3, 4)
+    # 各チャンネルが0と1になる彩度（3次式の実根）。コンパニオン行列の固有値としてまとめて求める
+    equations = np.concatenate([polynomials, polynomials - [0, 0, 0, 1]], axis=1)  # (n, 6, 4)
+    leading = equations[..., :1]
+    leading = np.where(np.abs(leading) < 1e-12, 1e-12, leading)  # 2次式に退化する色相で0除算しないようにする
+    companion = np.zeros(equations.shape[:-1] + (3, 3))
+    companion[..., 0, :] = -equations[..., 1:] / leading
+    companion[..., 1, 0] = companion[..., 2, 1] = 1
+    roots = np.linalg.eigvals(companion).reshape(len(L), -1)
+    roots = np.where((np.abs(roots.imag) <= 1e-9) & (roots.real > 0) & (roots.real <= MAX_CHROMA), roots.real, 0)
+
+    # 隣り合う根の間の区間ごとに、中点が全チャンネル [0, 1] ならその区間はガマット内で、上端がガマット内の彩度
+    bounds = np.sort(np.concatenate([roots, np.full((len(L), 1), MAX_CHROMA)], axis=1), axis=1)
+    lower, upper = bounds[:, :-1], bounds[:, 1:]
+    middle = ((lower + upper) / 2)[:, None, :]
+    a, b, c, d = (polynomials[..., k:k + 1] for k in range(4))
+    values = ((a * middle + b) * middle + c) * middle + d  # (n, 3, 区間)
+    inside = np.all((values >= 0) & (values <= 1), axis=1) & (upper > lower)
+    return np.where(inside, upper, 0).max(axis=1)
+
+
+def exact_max_chroma(L, H) -> np.ndarray:
+    """
+    L と H を固定し、sRGBのガマット内に収まる最大の彩度を3次式の根から直接求める。
+    color.max_chroma_bisect_batch は彩度0から途切れずにガマット内にある範囲の上限を求めるが、こちらは途中で
+    ガマット外を挟む場合も含めた最大値を返す（青の原色の付近では断面がくぼんでいて、原色自体はくぼみの外側にある）。
+    """
+    L, H = np.broadcast_arrays(np.asarray(L, dtype=float), np.asarray(H, dtype=float))
+    flat_L, flat_H = L.ravel(), H.ravel()
+    chroma = np.empty(flat_L.shape)
+    for start in range(0, len(flat_L), EXACT_CHUNK_SIZE):
+        end = start + EXACT_CHUNK_SIZE
+        chroma[start:end] = _exact_max_chroma_flat(flat_L[start:end], flat_H[start:end])
+    return chroma.reshape(L.shape)
+
+
+def dilate_cells(cells) -> np.ndarray:
+    """セルの選択を上下左右と斜めの隣のセルに広げる（H は360度と0度をつなぐ）"""
+    grown = cells.copy()
+    grown[1:] |= cells[:-1]
+    grown[:-1] |= cells[1:]
+    return grown | np.roll(grown, 1, axis=1) | np.roll(grown, -1, axis=1)
+
+
+class GamutTable(NamedTuple):
+    """
+    OKLCHの (L, H) ごとのsRGBガマット内の最大彩度の表。格子点の間は双線形補間する。
+
+    OKLCHからRGBへの変換は、従来の color.oklch_to_srgb_batch と線形sRGBを経由する color.oklab_to_linear_srgb_batch で
+    同じ行列を使い、違いは結果をガンマ補正済みの値とみなすか線形の値とみなすかだけなので、どちらも [0, 1] の立方体が
+    ガマットになる。そのため表は両方のOKLCHに使える（Hex.to_oklch / hex_to_oklch_batch の値にも、
+    oklchPalette.json や linear_srgb_to_oklab_batch から求めた値にも使える）。
+
+    最大彩度は (L, H) についてなめらかではなく、カスプやsRGBのチャンネルが切り替わる色相で折れ曲がり、
+    青の原色の色相 (H ≈ 264.05度) の付近ではカスプより暗い範囲で不連続になる。
+    補間誤差が大きいセルは exact_cells に記録し、その中の点では exact_max_chroma で直接求める
+    （既定の格子ではランダムな (L, H) の約2.5%）。max_chroma の誤差は MAX_ERROR 以下。
+    """
+    chroma: np.ndarray  # (LIGHTNESS_STEPS + 1, HUE_STEPS + 1) の格子点の最大彩度
+    exact_cells: np.ndarray  # (LIGHTNESS_STEPS, HUE_STEPS) の最大彩度を直接求めるセル
+
+    @property
+    def lightness_steps(self) -> int:
+        return self.chroma.shape[0] - 1
+
+    @property
+    def hue_steps(self) -> int:
+        return self.chroma.shape[1] - 1
+
+    def matches(self, lightness_steps, hue_steps) -> bool:
+        return (self.lightness_steps, self.hue_steps) == (lightness_steps, hue_steps)
+
+    def max_chroma(self, L, H) -> np.ndarray:
+        """L (0-1) と H (0-360度) の配列に対する最大彩度（L は 0-1 に切り詰める）"""
+        L, H = np.broadcast_arrays(np.clip(np.asarray(L, dtype=float), 0, 1), np.mod(np.asarray(H, dtype=float), 360))
+        x, y = L * self.lightness_steps, H / 360 * self.hue_steps
+        i = np.minimum(x.astype(np.intp), self.lightness_steps - 1)
+        j = np.minimum(y.astype(np.intp), self.hue_steps - 1)
+        fl, fh = x - i, y - j
+        table = self.chroma
+        chroma = np.asarray((1 - fl) * ((1 - fh) * table[i, j] + fh * table[i, j + 1])
+                            + fl * ((1 - fh) * table[i + 1, j] + fh * table[i + 1, j + 1]))
+        exact = self.exact_cells[i, j]
+        if exact.any():
+            chroma[exact] = exact_max_chroma(L[exact], H[exact])
+        return chroma
+
+    def in_gamut(self, oklch) -> np.ndarray:
+        """
+        OKLCH配列の各色がガマット内か。青の原色の付近では最大彩度より低い彩度でもガマット外になることがあるため、
+        表ではなくRGBに変換して判定する（変換の計算量は表の参照と同程度）
+        """
+        return color.in_srgb_gamut_batch(color.oklch_to_srgb_batch(oklch))
+
+    def clamp_chroma(self, oklch, precision=color.CHROMA_PRECISION) -> np.ndarray:
+        """
+        OKLCH配列のうちガマット外の色の彩度を表の最大彩度まで下げる（color.gamut_map_oklch_batch と同じく
+        L は 0-1 に切り詰め、H とガマット内の色は変えない）。結果は必ずガマット内で、
+        表の値でガマット外に残る色（補間値が真の値を上回る場合と、青の原色の付近のくぼみ）だけ二分探索で求める。
+        """
+        oklch = np.array(oklch, dtype=float)
+        outside = ~self.in_gamut(oklch)
+        if outside.any():
+            target = oklch[outside]
+            target[:, 0] = np.clip(target[:, 0], 0, 1)
+            target[:, 1] = np.minimum(target[:, 1], self.max_chroma(target[:, 0], target[:, 2]))
+            remaining = ~self.in_gamut(target)
+            if remaining.any():
+                rest = target[remaining]
+                target[remaining, 1] = color.max_chroma_bisect_batch(rest[:, 0], rest[:, 2], rest[:, 1], precision)
+            oklch[outside] = target
+        return oklch
+
+
+def build_table(lightness_steps=LIGHTNESS_STEPS, hue_steps=HUE_STEPS) -> GamutTable:
+    """全ての格子点の最大彩度を直接求め、各セルの中心での補間誤差から直接求めるセルを選んで表を作る"""
+    L, H = np.meshgrid(np.linspace(0, 1, lightness_steps + 1), np.linspace(0, 360, hue_steps + 1), indexing='ij')
+    chroma = exact_max_chroma(L, H)
+    chroma[:, -1] = chroma[:, 0]  # 360度の列は0度の列と同じにする
+    table = GamutTable(chroma, np.zeros((lightness_steps, hue_steps), dtype=bool))
+
+    center_L, center_H = (L[:-1, :-1] + L[1:, 1:]) / 2, (H[:-1, :-1] + H[1:, 1:]) / 2
+    errors = table.max_chroma(center_L, center_H) - exact_max_chroma(center_L, center_H)
+    # 折れ目や不連続がセルの中心から離れている場合に備えて隣のセルも含める
+    return table._replace(exact_cells=dilate_cells(np.abs(errors) > EXACT_CELL_ERROR))
+
+
+def save_table(table, path):
+    temp_path = f"{path}.tmp.npz"
+    np.savez_compressed(temp_path, version=TABLE_VERSION, chroma=table.chroma, exact_cells=table.exact_cells)
+    os.replace(temp_path, path)
+
+
+def load_table(path) -> GamutTable | None:
+    """保存した表を読み込む（ファイルがない場合や形式が古い場合は None）"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if int(data["version"]) != TABLE_VERSION:
+            return None
+        return GamutTable(data["chroma"], data["exact_cells"])
+
+
+@functools.lru_cache(maxsize=None)
+def get_table(path=TABLE_FILE, lightness_steps=LIGHTNESS_STEPS, hue_steps=HUE_STEPS) -> GamutTable:
+    """
+    最大彩度の表を返す。保存済みの表がないか、格子の大きさが異なる場合は作り直して保存する。
+    同じプロセス内では一度読み込んだ表を使い回す。
+    """
+    table = load_table(path)
+    if table is None or not table.matches(lightness_steps, hue_steps):
+        table = build_table(lightness_steps, hue_steps)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        save_table(table, path)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OKLCHの (L, H) ごとのsRGBの最大彩度の表を作成する")
+    parser.add_argument("--output", default=TABLE_FILE, help="表の保存先")
+    parser.add_argument("--lightness-steps", type=int, default=LIGHTNESS_STEPS, help="L の分割数")
+    parser.add_argument("--hue-steps", type=int, default=HUE_STEPS, help="H の分割数")
+    args = parser.parse_args()
+
+    table = build_table(args.lightness_steps, args.hue_steps)
+    save_table(table, args.output)
+    print(f"Saved {table.chroma.shape} table to {args.output} "
+          f"({table.exact_cells.mean():.1%} of cells are evaluated exactly)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from scripts.common import color, gamuttable
+
+# 表の作成には使わない乱数で誤差を測る
+TEST_SEED = 20261016
+RANDOM_SAMPLES = 300000
+# 補間が難しい点の周り: sRGBの原色と二次色（カスプ）と、青の原色の色相で最大彩度が不連続になる範囲
+CORNER_COLORS = ["#ff0000", "#ffff00", "#00ff00", "#00ffff", "#0000ff", "#ff00ff"]
+CORNER_RADIUS = (0.02, 1.0)  # (L, H度) の範囲
+BLUE_RIDGE = ((0.0, 0.5), (263.5, 264.7))  # (L, H度) の範囲
+DENSE_STEPS = 200
+
+
+@pytest.fixture(scope="module")
+def table():
+    return gamuttable.build_table()
+
+
+def linear_oklch(hex_values) -> np.ndarray:
+    linear = color.srgb_to_linear_batch(color.hex_to_srgb_batch(hex_values))
+    return color.oklab_to_oklch_batch(color.linear_srgb_to_oklab_batch(linear))
+
+
+def dense_grid(L_range, H_range) -> tuple[np.ndarray, np.ndarray]:
+    L, H = np.meshgrid(np.linspace(*L_range, DENSE_STEPS), np.linspace(*H_range, DENSE_STEPS), indexing='ij')
+    return L.ravel(), H.ravel()
+
+
+@pytest.fixture(scope="module")
+def samples():
+    """誤差を測る (L, H) と、その点で直接求めた最大彩度"""
+    L, H = error_samples()
+    return L, H, gamuttable.exact_max_chroma(L, H)
+
+
+def error_samples() -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(TEST_SEED)
+    samples = [(rng.uniform(0, 1, RANDOM_SAMPLES), rng.uniform(0, 360, RANDOM_SAMPLES)),
+               dense_grid(*BLUE_RIDGE)]
+    for L, _, H in linear_oklch(CORNER_COLORS):
+        samples.append(dense_grid((L - CORNER_RADIUS[0], L + CORNER_RADIUS[0]),
+                                  (H - CORNER_RADIUS[1], H + CORNER_RADIUS[1])))
+    return np.concatenate([L for L, _ in samples]), np.concatenate([H for _, H in samples])
+
+
+def test_exact_max_chroma_is_on_the_boundary(samples):
+    L, H, chroma = samples
+    inside = color.oklch_to_srgb_batch(np.stack([L, chroma, H], axis=-1))
+    outside = color.oklch_to_srgb_batch(np.stack([L, chroma + 1e-6, H], axis=-1))
+    assert color.in_srgb_gamut_batch(inside).all()
+    assert not color.in_srgb_gamut_batch(outside, tolerance=0).any()
+
+
+def test_max_chroma_error_bound(table, samples):
+    L, H, exact = samples
+    errors = table.max_chroma(L, H) - exact
+    assert np.abs(errors).max() <= gamuttable.MAX_ERROR
+
+
+def test_primaries_in_gamut(table):
+    # 原色と二次色はガマットの境界上にあり、従来の変換でも線形sRGBを経由する変換でも同じOKLCHになる
+    for oklch in [linear_oklch(CORNER_COLORS), color.hex_to_oklch_batch(CORNER_COLORS)]:
+        assert table.in_gamut(oklch).all()
+        np.testing.assert_allclose(table.max_chroma(oklch[:, 0], oklch[:, 2]), oklch[:, 1],
+                                   atol=gamuttable.MAX_ERROR)
+
+
+def test_srgb_colors_within_max_chroma(table):
+    rng = np.random.default_rng(TEST_SEED)
+    hex_values = [f"#{value:06x}" for value in rng.integers(0, 1 << 24, 100000)]
+    for oklch in [linear_oklch(hex_values), color.hex_to_oklch_batch(hex_values)]:
+        assert table.in_gamut(oklch).all()
+        assert (oklch[:, 1] <= table.max_chroma(oklch[:, 0], oklch[:, 2]) + gamuttable.MAX_ERROR).all()
+
+
+def test_in_gamut_below_max_chroma_near_blue(table):
+    # 青の原色の色相では、カスプより暗い範囲で最大彩度より低い彩度にガマット外のくぼみがある
+    L, _, H = linear_oklch(["#0000ff"])[0]
+    assert not table.in_gamut([L, 0.29, H])
+    assert table.max_chroma(L, H) > 0.29
+
+
+def test_clamp_chroma(table, samples):
+    rng = np.random.default_rng(TEST_SEED + 1)
+    L, H, exact = samples
+    oklch = np.stack([L, rng.uniform(0, gamuttable.MAX_CHROMA, len(L)), H], axis=-1)
+    clamped = table.clamp_chroma(oklch)
+    assert color.in_srgb_gamut_batch(color.oklch_to_srgb_batch(clamped)).all()
+
+    inside = table.in_gamut(oklch)
+    np.testing.assert_array_equal(clamped[inside], oklch[inside])
+    # 彩度を下げすぎない。くぼみでは二分探索（彩度0から途切れずにガマット内の範囲）、黒の付近では
+    # 二分探索が GAMUT_TOLERANCE の分だけ境界を越えるため直接求めた最大彩度の、小さい方と比べる
+    target = oklch[~inside]
+    mapped = color.gamut_map_oklch_batch(target)[:, 1]
+    lower = np.minimum(mapped, exact[~inside])
+    assert (clamped[~inside, 1] >= lower - gamuttable.MAX_ERROR - color.CHROMA_PRECISION).all()
@@ -0,0 +1,255 @@
+import contextlib
+import cProfile
+import datetime
+import os
+import signal
+import sys
+import time
+from collections import Counter, defaultdict
+
+from scripts.common import jsonstream
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 実行ごとの計測結果を1行ずつ追記するファイル
+METRICS_FILE = "../../data/results/metrics.ndjson"
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005  # サンプリングプロファイラの間隔（CPU時間の秒数）
+# カウンタ名の接尾辞（"<名前>_hits" と "<名前>_misses" の組からキャッシュのヒット率を計算する）
+HITS_SUFFIX = "_hits"
+MISSES_SUFFIX = "_misses"
+ITEMS_COUNTER = "items"  # 処理した件数のカウンタ（items_per_second の計算に使う）
+
+
+def peak_rss(who=None) -> int | None:
+    """プロセスの最大常駐メモリ (バイト)。who に resource.RUSAGE_CHILDREN を指定すると終了した子プロセスの最大値"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who)
+    # Linuxでは KiB、macOSではバイト単位
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+class Metrics:
+    """
+    1回の実行のステージごとの実行時間と回数、およびカウンタ。
+    ステージは入れ子にでき、それぞれの時間は重複して数えられる（合計は実行全体の時間と一致しない）。
+    """
+    enabled = True
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - start
+            self.stage_calls[name] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def cache_hit_rates(self) -> dict:
+        caches = {name[:-len(suffix)] for name in self.counters for suffix in (HITS_SUFFIX, MISSES_SUFFIX)
+                  if name.endswith(suffix)}
+        rates = {}
+        for cache in sorted(caches):
+            hits = self.counters.get(cache + HITS_SUFFIX, 0)
+            total = hits + self.counters.get(cache + MISSES_SUFFIX, 0)
+            rates[cache] = hits / total if total else None
+        return rates
+
+    def record(self) -> dict:
+        """JSONに保存できる計測結果"""
+        wall_seconds = time.perf_counter() - self.started
+        items = self.counters.get(ITEMS_COUNTER, 0)
+        return {
+            "run": self.name,
+            "started": self.started_at.isoformat(timespec='seconds'),
+            "argv": sys.argv,
+            "wall_seconds": wall_seconds,
+            "items": items,
+            "items_per_second": items / wall_seconds if wall_seconds > 0 else None,
+            "stages": {name: {"seconds": seconds, "calls": self.stage_calls[name]}
+                       for name, seconds in sorted(self.stage_seconds.items(), key=lambda item: -item[1])},
+            "counters": dict(self.counters),
+            "cache_hit_rates": self.cache_hit_rates(),
+            "peak_rss_bytes": peak_rss(),
+            "peak_rss_children_bytes": peak_rss(resource.RUSAGE_CHILDREN) if resource else None,
+        }
+
+
+class NullMetrics:
+    """計測しない場合の Metrics。ステージは使い回す nullcontext を返すだけで、時間を測らない"""
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+_active = NULL_METRICS
+
+
+def active():
+    """現在の実行の Metrics（計測していない場合は NULL_METRICS）"""
+    return _active
+
+
+def stage(name):
+    """現在の実行のステージの時間を測るコンテキストマネージャ"""
+    return _active.stage(name)
+
+
+def count(name, value=1):
+    _active.count(name, value)
+
+
+def timed(function, name):
+    """
+    呼び出すたびに時間をステージ name として測る関数を返す（計測していない場合は function をそのまま返す）。
+    レコードごとに呼ばれる処理など、呼び出し回数が多いものに使う。
+    """
+    if not _active.enabled:
+        return function
+    metrics = _active
+
+    def wrapper(*args, **kwargs):
+        with metrics.stage(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def timed_iter(iterable, name):
+    """iterable から次の要素を取り出す時間をステージ name として測る（計測していない場合はそのまま返す）"""
+    if not _active.enabled:
+        return iterable
+    return _timed_iter(iterable, name)
+
+
+def _timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with _active.stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class SamplingProfiler:
+    """
+    SIGPROF で一定のCPU時間ごとにメインスレッドのスタックを記録する簡易なサンプリングプロファイラ（Unixのみ）。
+    結果は flamegraph.pl や speedscope で読める collapsed 形式（"関数;関数;... 回数"）で保存する。
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._previous_handler = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.samples[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def dump_stats(self, file_path):
+        with open(file_path, 'w') as file:
+            for stack, samples in self.samples.most_common():
+                file.write(f"{stack} {samples}\n")
+
+
+def make_profiler(mode):
+    if mode == "cprofile":
+        return cProfile.Profile()
+    if mode == "sample":
+        return SamplingProfiler()
+    raise ValueError(f"Unknown profile mode: {mode} (expected one of {', '.join(PROFILE_MODES)})")
+
+
+def save_record(record, file_path):
+    """計測結果をNDJSONファイルに1行追記する"""
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with jsonstream.NdjsonWriter(file_path, append=True) as writer:
+        writer.write(record)
+
+
+def format_record(record) -> str:
+    """計測結果の要約（1ステージ1行）"""
+    lines = [f"[{record['run']}] {record['wall_seconds']:.3f}s, {record['items']} items"
+             + (f" ({record['items_per_second']:.1f}/s)" if record['items_per_second'] else "")
+             + (f", peak RSS {record['peak_rss_bytes'] / 2 ** 20:.1f} MiB" if record['peak_rss_bytes'] else "")]
+    for name, stage_record in record["stages"].items():
+        lines.append(f"  {name:<16} {stage_record['seconds']:>9.3f}s {stage_record['calls']:>8} calls")
+    for cache, rate in record["cache_hit_rates"].items():
+        if rate is not None:
+            lines.append(f"  {cache} cache hit rate {rate:.1%}")
+    return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def run(name, metrics_path=None, profile_path=None, profile_mode="cprofile"):
+    """
+    1回の実行を計測する。metrics_path を指定した場合は終了時に計測結果を追記して要約を標準エラーに表示し、
+    profile_path を指定した場合は実行全体のプロファイル（cProfile の .prof またはサンプリングの collapsed 形式）を保存する。
+    どちらも指定しない場合は何も計測しない（各ステージは何もしない nullcontext になる）。
+    プロファイルと計測の対象は現在のプロセスのみで、ワーカープロセス内のステージは含まれない。
+    """
+    global _active
+    if metrics_path is None and profile_path is None:
+        yield NULL_METRICS
+        return
+
+    metrics = Metrics(name)
+    profiler = make_profiler(profile_mode) if profile_path else None
+    _active = metrics
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            print(f"Profile saved to {profile_path}", file=sys.stderr)
+        _active = NULL_METRICS
+        if metrics_path is not None:
+            record = metrics.record()
+            save_record(record, metrics_path)
+            print(format_record(record), file=sys.stderr)
+
+
+def add_arguments(parser):
+    """計測とプロファイルのコマンドライン引数を parser に追加する"""
+    parser.add_argument("--metrics", nargs='?', const=METRICS_FILE,
+                        help=f"ステージごとの時間などの計測結果を追記するファイル（値を省略した場合は {METRICS_FILE}）")
+    parser.add_argument("--profile", help="実行全体のプロファイルを保存するファイル")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="cprofile",
+                        help="cprofile: cProfile の .prof 形式、sample: サンプリングの collapsed 形式")
@@ -0,0 +1,168 @@
+import itertools
+import json
+import os
+
+# 一度に読み込む文字数
+READ_CHUNK_SIZE = 1 << 16
+# NDJSON（1行1レコード）として扱う拡張子
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+# 出力をコンパクトにするための区切り文字
+COMPACT_SEPARATORS = (',', ':')
+
+
+def dumps_compact(record) -> str:
+    """レコードをライターが書き出すのと同じコンパクトなJSON文字列にする"""
+    return json.dumps(record, separators=COMPACT_SEPARATORS)
+
+
+def is_ndjson(file_path) -> bool:
+    return os.fspath(file_path).endswith(NDJSON_SUFFIXES)
+
+
+def iter_ndjson(file_path):
+    """NDJSONファイルから1行ずつレコードを読み込む"""
+    with open(file_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(file_path, read_size=READ_CHUNK_SIZE):
+    """トップレベルがJSON配列のファイルから、要素を1つずつ逐次的に読み込む"""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buffer = ''
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # 空白と要素間のカンマを読み飛ばす
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ',')):
+                pos += 1
+
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{file_path} is not a JSON array.")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # バッファ末尾で切れた数値などを誤って読まないよう、要素の後に区切り文字がある場合のみ確定する
+                    next_pos = end
+                    while next_pos < len(buffer) and buffer[next_pos].isspace():
+                        next_pos += 1
+                    if next_pos < len(buffer) and buffer[next_pos] in ',]':
+                        yield record
+                        pos = next_pos
+                        continue
+                    if eof:
+                        raise ValueError(f"Malformed JSON array in {file_path}.")
+            elif eof:
+                raise ValueError(f"Unexpected end of JSON array in {file_path}.")
+
+            # 読み込み済みの部分を捨てて、続きを読み込む
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def iter_records(file_path):
+    """拡張子に応じてNDJSONまたはJSON配列のファイルからレコードを逐次的に読み込む"""
+    if is_ndjson(file_path):
+        return iter_ndjson(file_path)
+    return iter_json_array(file_path)
+
+
+def iter_chunks(iterable, chunk_size):
+    """イテラブルを chunk_size 件ずつのリストに分割する"""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def ends_with_partial_line(file_path) -> bool:
+    """ファイルが存在し、空でなく、改行で終わっていないか"""
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    except FileNotFoundError:
+        return False
+
+
+class NdjsonWriter:
+    """
+    レコードを1行ずつNDJSONとして書き出す（append=True の場合は既存のファイルに追記する）。
+    追記時に既存のファイルが改行で終わっていない場合（書き込み途中で中断された場合など）は、
+    新しいレコードが途中の行につながらないよう先に改行を書く。
+    """
+
+    def __init__(self, file_path, append=False):
+        needs_newline = append and ends_with_partial_line(file_path)
+        self._file = open(file_path, 'a' if append else 'w')
+        if needs_newline:
+            self._file.write('\n')
+
+    def write(self, record):
+        self.write_serialized(dumps_compact(record))
+
+    def write_serialized(self, text):
+        """dumps_compact で直列化済みのレコードを書き出す"""
+        self._file.write(text)
+        self._file.write('\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self, complete=True):
+        """ファイルを閉じる（complete は JsonArrayWriter 用。NDJSONは書き出した行までがそのまま読める）"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+
+class JsonArrayWriter(NdjsonWriter):
+    """レコードを1件ずつコンパクトなJSON配列として書き出す（1行1レコード）"""
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self._file.write('[')
+        self._count = 0
+
+    def write_serialized(self, text):
+        self._file.write(',\n' if self._count else '\n')
+        self._file.write(text)
+        self._count += 1
+
+    def close(self, complete=True):
+        """
+        配列を閉じてからファイルを閉じる。complete=False（with ブロックが例外で終わった場合）は配列を閉じず、
+        途中で終わった出力が完全なJSONとして読めてしまわないようにする
+        """
+        if complete:
+            self._file.write('\n]\n')
+        super().close()
+
+
+def open_record_writer(file_path):
+    """拡張子に応じてNDJSONまたはJSON配列のライターを開く"""
+    if is_ndjson(file_path):
+        return NdjsonWriter(file_path)
+    return JsonArrayWriter(file_path)
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from scripts.common import jsonstream
+
+# バイナリ形式の設定
+# (パレット数, 色数, 3) の float32 配列を .npy 形式（形状とdtypeを持つ小さなヘッダー付き）で保存する
+PALETTE_DTYPE = np.float32
+PALETTE_DECIMALS = 3  # JSONに戻す際の小数点以下の桁数（convertPalette の丸めと同じ）
+
+PROCESSED_DIR = "../../data/processed/"
+PROCESSED_FILES = ["oklchPalette.json", "train_oklchPalette.json", "test_oklchPalette.json"]
+
+
+def npy_path_for(json_path) -> str:
+    """JSONファイルに対応する .npy ファイルのパスを返す"""
+    return os.path.splitext(os.fspath(json_path))[0] + '.npy'
+
+
+def json_to_npy(json_path, npy_path=None) -> str:
+    """
+    OKLCHパレットのJSONファイルを .npy ファイルに変換する。
+    JSONは2回逐次的に読み込み（件数の確認と書き込み）、メモリ上にデータ全体を保持しない。
+    """
+    npy_path = npy_path or npy_path_for(json_path)
+
+    count = 0
+    shape = None
+    for palette in jsonstream.iter_records(json_path):
+        palette_shape = np.shape(palette)
+        if shape is None:
+            shape = palette_shape
+        elif palette_shape != shape:
+            raise ValueError(f"All palettes must have the same shape: {palette_shape} != {shape}")
+        count += 1
+    if shape is None:
+        shape = (0, 3)
+
+    palettes = np.lib.format.open_memmap(npy_path, mode='w+', dtype=PALETTE_DTYPE, shape=(count, *shape))
+    for i, palette in enumerate(jsonstream.iter_records(json_path)):
+        palettes[i] = palette
+    palettes.flush()
+    del palettes
+    return npy_path
+
+
+def npy_to_json(npy_path, json_path=None, decimals=PALETTE_DECIMALS, integral_floats=False) -> str:
+    """.npy ファイルをJSONファイルに変換する（書式は save_palettes_json を参照）"""
+    json_path = json_path or os.path.splitext(os.fspath(npy_path))[0] + '.json'
+    save_palettes_json(load_palettes(npy_path), json_path, decimals, integral_floats)
+    return json_path
+
+
+def save_palettes_json(palettes, json_path, decimals=PALETTE_DECIMALS, integral_floats=False):
+    """
+    パレットの配列をインデント2のJSONファイルとして保存する。
+    integral_floats=False の場合は整数値を整数表記 (0, 1) にし、convertPalette の出力 (oklchPalette.json) と同じ書式になる。
+    integral_floats=True の場合は小数表記 (0.0, 1.0) にし、splitData の出力 (train/test_oklchPalette.json) と同じ書式になる。
+    """
+
+    def to_json_value(value):
+        value = round(float(value), decimals)
+        return int(value) if value.is_integer() and not integral_floats else value
+
+    with open(json_path, 'w') as f:
+        json.dump([[[to_json_value(value) for value in lch] for lch in palette] for palette in palettes], f,
+                  indent=2)
+
+
+def load_palettes(npy_path, mmap=True) -> np.ndarray:
+    """.npy ファイルを読み込む（デフォルトでは読み取り専用のメモリマップとして開き、プロセス間でページを共有する）"""
+    return np.load(npy_path, mmap_mode='r' if mmap else None)
+
+
+def open_palettes(json_path, mmap=True) -> np.ndarray:
+    """
+    OKLCHパレットのJSONファイルに対応する .npy を開く。
+    .npy が存在しないかJSONより古い場合は、先にJSONから作り直す。
+    """
+    npy_path = npy_path_for(json_path)
+    if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(json_path):
+        json_to_npy(json_path, npy_path)
+    return load_palettes(npy_path, mmap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OKLCHパレットのJSONと .npy を相互に変換する")
+    parser.add_argument("command", choices=["to-npy", "to-json"], nargs='?', default="to-npy")
+    parser.add_argument("paths", nargs='*', help="変換するファイル（to-npy で省略した場合は data/processed のJSON全て）")
+    parser.add_argument("--integral-floats", action="store_true",
+                        help="to-json で整数値を小数表記 (0.0, 1.0) にする（splitData の出力と同じ書式）")
+    args = parser.parse_args()
+
+    if args.command == "to-npy":
+        paths = args.paths or [os.path.join(PROCESSED_DIR, name) for name in PROCESSED_FILES]
+        for path in paths:
+            print(f"{path} -> {json_to_npy(path)}")
+    else:
+        # 既存のJSONを誤って上書きしないよう、to-json では変換するファイルの指定を必須とする
+        if not args.paths:
+            parser.error("to-json requires at least one .npy path")
+        for path in args.paths:
+            print(f"{path} -> {npy_to_json(path, integral_floats=args.integral_floats)}")
+
+
+if __name__ == "__main__":
+    main()
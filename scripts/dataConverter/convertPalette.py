@@ -0,0 +1,97 @@
+import numpy as np
+
+from scripts.common import color, jsonstream, palettestore
+
+RGB_PALETTE_PATH = "../../data/raw/rgbPalette.json"
+OUTPUT_FILE_PATH = "../../data/processed/oklchPalette.json"
+
+# convertPalette.ts（chroma-js 3.1.2 の oklch()）と同じ結果になるよう、chroma-js と同じ定数を使う
+# sRGB（線形）-> XYZ (D65)
+CHROMA_RGB_TO_XYZ = np.array([
+    [0.4124564390896922, 0.357576077643909, 0.18043748326639894],
+    [0.21267285140562253, 0.715152155287818, 0.07217499330655958],
+    [0.0193338955823293, 0.11919202588130297, 0.9503040785363679]
+])
+
+# XYZ (D65) -> LMS
+CHROMA_XYZ_TO_LMS = np.array([
+    [0.819022437996703, 0.3619062600528904, -0.1288737815209879],
+    [0.0329836539323885, 0.9292868615863434, 0.0361446663506424],
+    [0.0481771893596242, 0.2642395317527308, 0.6335478284694309]
+])
+
+# LMS' -> OKLab
+CHROMA_LMS_TO_OKLAB = np.array([
+    [0.210454268309314, 0.7936177747023054, -0.0040720430116193],
+    [1.9779985324311684, -2.4285922420485799, 0.450593709617411],
+    [0.0259040424655478, 0.7827717124575296, -0.8086757549230774]
+])
+
+DECIMALS = 3  # 各値は小数点以下第3位まで
+
+
+def multiply_matrix(matrix, values):
+    """(N, 3) の各行に3x3行列を掛ける（chroma-js と同じく各成分を左から順に足し合わせる）"""
+    return np.stack([matrix[i, 0] * values[:, 0] + matrix[i, 1] * values[:, 1] + matrix[i, 2] * values[:, 2]
+                     for i in range(3)], axis=-1)
+
+
+def js_round(values, decimals=DECIMALS):
+    """JavaScript の Math.round(value * 10^n) / 10^n と同じ丸めを行う"""
+    scale = 10 ** decimals
+    return np.floor(values * scale + 0.5) / scale
+
+
+def convert_rgb_to_oklch(hex_values) -> np.ndarray:
+    """
+    Hex色の配列を (N, 3) の [l, c, h / 360] に変換する。各値は0-1の範囲で、小数点以下第3位。
+    無彩色（彩度がほぼ0）の色は chroma-js と同じく h が NaN になる。
+    """
+    rgb = color.hex_to_srgb_batch(hex_values)
+    magnitude = np.abs(rgb)
+    linear = np.where(magnitude <= 0.04045, rgb / 12.92, np.sign(rgb) * ((magnitude + 0.055) / 1.055) ** 2.4)
+
+    lms = multiply_matrix(CHROMA_XYZ_TO_LMS, multiply_matrix(CHROMA_RGB_TO_XYZ, linear))
+    oklab = multiply_matrix(CHROMA_LMS_TO_OKLAB, np.cbrt(lms))
+
+    L, a, b = oklab[:, 0], oklab[:, 1], oklab[:, 2]
+    c = np.sqrt(a * a + b * b)
+    h = (np.arctan2(b, a) * (180 / np.pi) + 360) % 360
+    h = np.where(js_round(c, 4) == 0, np.nan, h)
+
+    return js_round(np.stack([L, c, h / 360], axis=-1))
+
+
+def convert_palette_list(rgb_palettes) -> np.ndarray:
+    """
+    RGBパレットをOklchパレットに変換する
+    また、hueの値で順序をソートする
+    """
+    rgb_palettes = list(rgb_palettes)
+    if not rgb_palettes:
+        return np.empty((0, 0, 3))
+    palette_size = len(rgb_palettes[0])
+    hex_values = [hex_value for palette in rgb_palettes for hex_value in palette]
+    palettes = convert_rgb_to_oklch(hex_values).reshape(-1, palette_size, 3)
+
+    # NaNを含むパレットを除外
+    palettes = palettes[~np.isnan(palettes).any(axis=(1, 2))]
+
+    # パレット内をhueでソートし、パレットを先頭の色のhueでソート（どちらも安定ソート）
+    order = np.argsort(palettes[..., 2], axis=1, kind='stable')
+    palettes = np.take_along_axis(palettes, order[..., None], axis=1)
+    return palettes[np.argsort(palettes[:, 0, 2], kind='stable')]
+
+
+def main():
+    palettes = convert_palette_list(jsonstream.iter_records(RGB_PALETTE_PATH))
+
+    # convertPalette.ts と同じ書式のJSONと、メモリマップ用の .npy を書き出す
+    palettestore.save_palettes_json(palettes, OUTPUT_FILE_PATH)
+    np.save(palettestore.npy_path_for(OUTPUT_FILE_PATH), palettes.astype(palettestore.PALETTE_DTYPE))
+
+    print(f"変換完了。ファイルに保存されました: {OUTPUT_FILE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
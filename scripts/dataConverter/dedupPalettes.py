@@ -0,0 +1,235 @@
+import argparse
+import functools
+import json
+from itertools import product
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from scripts.analyzePalette.paletteIndex import (PERMUTATION_MAX_COLORS, hex_palettes_to_oklab, palette_permutations,
+                                                 permutation_block_size, squared_color_distances)
+from scripts.common import jsonstream
+
+INPUT_FILE = "../../data/processed/oklchPalette.json"
+OUTPUT_FILE = "../../data/processed/dedup_oklchPalette.json"
+REPORT_FILE = "../../data/results/dedup_report.json"
+
+# 対応する色同士の最大の色差 (ΔE-OK) がこの値以下のパレットを重複とみなす
+DEFAULT_TOLERANCE = 0.02
+
+# バケットのキーに使う、チャンネルごとにソートした色の座標の数（値のばらつきが大きい順に選ぶ）。
+# 次元を増やすほどセルが疎になり候補の組が減るが、隣り合うセルを調べる回数は (3^次元 + 1) / 2 回に増える
+KEY_DIMENSIONS = 6
+PAIR_CHUNK_SIZE = 20000  # 候補の組を判定する1回あたりの数（メモリ使用量を一定に保つ）
+
+
+def oklch_palettes_to_oklab(oklch_palettes) -> np.ndarray:
+    """convertPalette の形式（[l, c, h / 360]）のパレットを (パレット数, 色数, 3) のOKLabに変換する"""
+    oklch = np.asarray(oklch_palettes, dtype=np.float64)
+    hue = oklch[..., 2] * (2 * np.pi)
+    return np.stack([oklch[..., 0], oklch[..., 1] * np.cos(hue), oklch[..., 1] * np.sin(hue)], axis=-1)
+
+
+def records_to_oklab(records) -> np.ndarray:
+    """Hex形式またはOKLCH形式のパレットのリストをOKLabに変換する"""
+    if records and isinstance(records[0][0], str):
+        return hex_palettes_to_oklab(records)
+    return oklch_palettes_to_oklab(records)
+
+
+def bottleneck_assignment(distances) -> float:
+    """
+    色数 x 色数 の距離行列について、色の対応付けのうち最大の距離が最小となるときの、その最大の距離。
+    しきい値を距離の値の中から二分探索し、しきい値を超える組を使わない対応付けがあるかを割り当て問題で調べる。
+    """
+    values = np.unique(distances)
+    # どの色も何かに対応付けられるため、各行・各列の最小値のうち最大のものより小さい値にはならない
+    lower = max(distances.min(axis=1).max(), distances.min(axis=0).max())
+    low, high = int(np.searchsorted(values, lower)), len(values) - 1
+    while low < high:
+        middle = (low + high) // 2
+        over = distances > values[middle]
+        if over[linear_sum_assignment(over)].any():
+            low = middle + 1
+        else:
+            high = middle
+    return float(values[low])
+
+
+def max_matching_distances(oklab_palettes, candidates) -> np.ndarray:
+    """
+    パレット (..., 色数, 3) と候補 (..., 色数, 3) について、色の対応付けを最適に選んだときの
+    対応する色同士の最大の色差 (ΔE-OK)。
+    PERMUTATION_MAX_COLORS 色までは全ての順列をブロックごとにまとめて調べ、それより多い場合は組ごとに
+    bottleneck_assignment で求める（どちらもメモリ使用量は組の数に比例する）。
+    """
+    oklab_palettes, candidates = np.broadcast_arrays(np.asarray(oklab_palettes, dtype=np.float64),
+                                                     np.asarray(candidates, dtype=np.float64))
+    shape, palette_size = candidates.shape[:-2], candidates.shape[-2]
+    oklab_palettes = oklab_palettes.reshape(-1, palette_size, 3)
+    candidates = candidates.reshape(-1, palette_size, 3)
+    if palette_size > PERMUTATION_MAX_COLORS:
+        distances = np.sqrt(squared_color_distances(oklab_palettes, candidates))
+        return np.array([bottleneck_assignment(pair) for pair in distances], dtype=np.float64).reshape(shape)
+
+    permutations = palette_permutations(palette_size)
+    block = permutation_block_size(palette_size)
+    result = np.empty(len(candidates))
+    for start in range(0, len(candidates), block):
+        differences = (oklab_palettes[start:start + block, None]
+                       - candidates[start:start + block][:, permutations])
+        result[start:start + block] = np.sqrt(np.square(differences).sum(axis=-1)).max(axis=-1).min(axis=-1)
+    return result.reshape(shape)
+
+
+@functools.lru_cache(maxsize=None)
+def neighbor_offsets(dimensions: int) -> np.ndarray:
+    """
+    隣り合うセルを調べるためのオフセット。0 と、3^次元 - 1 個の近傍のうち辞書順で正の半分
+    （残りの半分は反対側のセルから見たときに数えられるため、各セルの組を1回だけ調べる）
+    """
+    return np.array([offset for offset in product((-1, 0, 1), repeat=dimensions) if offset >= (0,) * dimensions])
+
+
+def iter_candidate_pairs(cells):
+    """
+    (パレット数, 次元) のセルの座標について、同じセルまたは隣り合うセルに入っているパレットの組 (i, j) を、
+    オフセットごとの配列として返す。セルごとにまとめて配列操作で展開するため、Pythonのループはオフセットの数のみ。
+    """
+    cells = cells - cells.min(axis=0) + 1  # 隣のセルの座標が負にならないようにする
+    dims = cells.max(axis=0) + 2
+    strides = np.cumprod(np.concatenate([[1], dims[:0:-1]]))[::-1]  # セルの座標を1つの整数のキーにする係数
+    keys = cells @ strides
+
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    for offset in neighbor_offsets(cells.shape[1]):
+        neighbor_keys = unique_keys + offset @ strides
+        positions = np.minimum(np.searchsorted(unique_keys, neighbor_keys), len(unique_keys) - 1)
+        found = np.flatnonzero(unique_keys[positions] == neighbor_keys)
+        a, b = found, positions[found]
+
+        # セルの組 (a, b) ごとに、a のパレット x b のパレットの全ての組を展開する
+        sizes = counts[a] * counts[b]
+        offsets_in_pair = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        b_counts = np.repeat(counts[b], sizes)
+        i = order[np.repeat(starts[a], sizes) + offsets_in_pair // b_counts]
+        j = order[np.repeat(starts[b], sizes) + offsets_in_pair % b_counts]
+        if not offset.any():
+            keep = i < j  # 同じセル内の組は1回だけ
+            i, j = i[keep], j[keep]
+        yield i, j
+
+
+def find_duplicate_pairs(oklab_palettes, tolerance=DEFAULT_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    max_matching_distances が tolerance 以下のパレットの組 (i, j)（i < j）を全て返す。
+
+    1次元では値をソートして対応付けると最大の差が最小になるため、チャンネルごとにソートした色の各座標の差は
+    最適な対応付けでの色差を超えない。そのため、ソートした座標のうちばらつきの大きい KEY_DIMENSIONS 個を
+    tolerance 間隔のグリッドで量子化してバケットに分け、同じセルと隣り合うセルのパレットとのみ比較すれば
+    見落としなく全ての重複を見つけられる。色が集中するデータでも重心の3次元のグリッドより格段にセルが疎になる。
+    候補の組は、ソートした全ての座標の差でさらに絞り込んでから、全ての対応付けで厳密に判定する。
+    """
+    count, palette_size = oklab_palettes.shape[:2]
+    sorted_channels = np.sort(oklab_palettes, axis=1).reshape(count, palette_size * 3)
+    key_dimensions = np.argsort(-sorted_channels.std(axis=0), kind='stable')[:KEY_DIMENSIONS]
+    cells = np.floor(sorted_channels[:, key_dimensions] / tolerance).astype(np.int64)
+
+    first, second = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)]
+    for pair_i, pair_j in iter_candidate_pairs(cells):
+        for start in range(0, len(pair_i), PAIR_CHUNK_SIZE):
+            i, j = pair_i[start:start + PAIR_CHUNK_SIZE], pair_j[start:start + PAIR_CHUNK_SIZE]
+            bounds = np.abs(sorted_channels[i] - sorted_channels[j]).max(axis=1)
+            i, j = i[bounds <= tolerance], j[bounds <= tolerance]
+            duplicates = max_matching_distances(oklab_palettes[i], oklab_palettes[j]) <= tolerance
+            first.append(np.minimum(i[duplicates], j[duplicates]))
+            second.append(np.maximum(i[duplicates], j[duplicates]))
+    return np.concatenate(first), np.concatenate(second)
+
+
+def find_duplicate_groups(oklab_palettes, tolerance=DEFAULT_TOLERANCE) -> list[list[int]]:
+    """
+    近似的に重複するパレットのグループ（2件以上のもの）を、各グループ内・グループ間とも出現順で返す。
+    各グループの最初のパレットが代表で、残りは代表との色差 (max_matching_distances) が tolerance 以下のもの。
+
+    パレットを出現順に見て、それまでに残した代表のいずれかと tolerance 以下なら最初のその代表のグループに入れ、
+    そうでなければ新しい代表として残す（推移的にはまとめないため、代表から tolerance を超えて離れたパレットは取り除かない）。
+    """
+    oklab_palettes = np.asarray(oklab_palettes, dtype=np.float64)
+    count = len(oklab_palettes)
+    if count == 0:
+        return []
+    first, second = find_duplicate_pairs(oklab_palettes, tolerance)
+
+    # 組を (j, i) の順に並べると、j を判定する時点で i < j の全てのパレットの代表かどうかが決まっている
+    order = np.lexsort((first, second))
+    representative = list(range(count))
+    kept = [True] * count
+    for i, j in zip(first[order].tolist(), second[order].tolist()):
+        if kept[j] and kept[i]:
+            kept[j] = False
+            representative[j] = i
+
+    groups = {}
+    for index, leader in enumerate(representative):
+        groups.setdefault(leader, []).append(index)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def dedup_records(records, tolerance=DEFAULT_TOLERANCE) -> tuple[list, list[dict]]:
+    """
+    重複するパレットを各グループの最初のもの（代表）だけ残して取り除く（取り除くのは代表から tolerance 以下のもののみ）。
+
+    Returns:
+    (list, list[dict]): 残ったパレットと、グループごとのレポート（代表と取り除いたパレットの番号と内容、代表からの色差）
+    """
+    oklab = records_to_oklab(records)
+    groups = find_duplicate_groups(oklab, tolerance)
+
+    removed = set()
+    report = []
+    for representative, *duplicates in groups:
+        removed.update(duplicates)
+        distances = max_matching_distances(oklab[representative], oklab[duplicates])
+        report.append({
+            "kept": {"index": representative, "palette": records[representative]},
+            "removed": [{"index": index, "palette": records[index], "delta_e": round(float(distance), 4)}
+                        for index, distance in zip(duplicates, distances)],
+        })
+    kept = [record for i, record in enumerate(records) if i not in removed]
+    return kept, report
+
+
+def save_records(records, file_path):
+    """パレットを入力と同じ書式で保存する（Hexは rgbPalette.json と同じ1行1パレット、OKLCHは splitData と同じ）"""
+    with open(file_path, 'w') as file:
+        if records and isinstance(records[0][0], str):
+            file.write('[\n' + ',\n'.join('  ' + json.dumps(record) for record in records) + '\n]\n')
+        else:
+            json.dump(records, file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="色のわずかな違いや順序の違いだけのパレットを取り除く（splitData の前に実行する）")
+    parser.add_argument("--input", default=INPUT_FILE, help="パレットのファイル（Hex形式またはOKLCH形式）")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="重複を取り除いたパレットの保存先")
+    parser.add_argument("--report", default=REPORT_FILE, help="まとめたグループのレポートの保存先")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="重複とみなす、対応する色同士の最大の色差 (ΔE-OK)")
+    args = parser.parse_args()
+
+    records = list(jsonstream.iter_records(args.input))
+    kept, report = dedup_records(records, args.tolerance)
+    save_records(kept, args.output)
+    with open(args.report, 'w') as file:
+        json.dump({"tolerance": args.tolerance, "input": len(records), "output": len(kept), "groups": report},
+                  file, indent=2)
+
+    print(f"{len(records)} -> {len(kept)} palettes ({len(report)} groups merged). Saved to {args.output}")
+    print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,34 @@
+import argparse
 import json
 from sklearn.model_selection import train_test_split
 import numpy as np
+from scripts.common import jsonstream
 
-# JSONファイルの読み込み
-with open('../../data/processed/oklchPalette.json', 'r') as file:
-    data = json.load(file)
+parser = argparse.ArgumentParser(description="OKLCHパレットを訓練データとテストデータに分割する")
+parser.add_argument("--input", default='../../data/processed/oklchPalette.json',
+                    help="分割するパレットのファイル（重複を取り除く場合は dedupPalettes.py の出力を指定する）")
+args = parser.parse_args()
 
-# Numpy配列に変換（データ操作を簡単にするため）
-data = np.array(data)
+# JSONファイルを1パレットずつ読み込む（値はfloatに揃える）
+# 分割後のデータはシャッフルされた順序で書き出すため、パレット自体はリストとして保持する
+data = [[[float(value) for value in lch] for lch in palette]
+        for palette in jsonstream.iter_records(args.input)]
 
 # 訓練データとテストデータに分割 (80%を訓練用, 20%をテスト用)
-train_data, test_data = train_test_split(data, test_size=0.2, random_state=42)
+# データ全体をNumpy配列にコピーせず、インデックスだけを分割する
+train_indices, test_indices = train_test_split(np.arange(len(data)), test_size=0.2, random_state=42)
+
+
+def save_split(indices, file_path):
+    """指定したインデックスのパレットをJSONとして書き出す（json.dump は要素ごとに逐次書き込む）"""
+    with open(file_path, 'w') as file:
+        json.dump([data[i] for i in indices], file, indent=2)
+
 
 # 訓練データの保存
-with open('../../data/processed/train_oklchPalette.json', 'w') as train_file:
-    json.dump(train_data.tolist(), train_file, indent=2)
+save_split(train_indices, '../../data/processed/train_oklchPalette.json')
 
 # テストデータの保存
-with open('../../data/processed/test_oklchPalette.json', 'w') as test_file:
-    json.dump(test_data.tolist(), test_file, indent=2)
+save_split(test_indices, '../../data/processed/test_oklchPalette.json')
 
 print("データを訓練データとテストデータに分割しました。")
@@ -0,0 +1,122 @@
+import sqlite3
+import time
+
+# クロールの状態を記録するSQLiteファイル
+MANIFEST_FILE = "../../data/results/crawl_manifest.sqlite"
+
+# URLごとの状態
+PENDING = "pending"  # 未取得
+IN_PROGRESS = "in_progress"  # 取得中（実行が中断された場合はこの状態のまま残る）
+DONE = "done"  # 取得済み
+FAILED = "failed"  # 失敗（バックオフ後に再試行する）
+
+DEFAULT_FRESHNESS = 7 * 24 * 60 * 60  # 取得済みのURLを再取得しない期間（秒）
+DEFAULT_MAX_ATTEMPTS = 3  # 連続して失敗したURLを諦めるまでの試行回数（諦めたURLも DEFAULT_FRESHNESS 後に再試行する）
+BACKOFF_BASE = 30.0  # 再試行までの待機時間の基準（秒）。失敗するたびに2倍にする
+BACKOFF_MAX = 60 * 60.0  # 再試行までの待機時間の上限（秒）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    captured_at REAL,
+    next_attempt_at REAL,
+    screenshot_hash TEXT,
+    settle_time REAL,
+    error TEXT
+)
+"""
+
+
+def backoff_delay(attempts, base=BACKOFF_BASE, maximum=BACKOFF_MAX) -> float:
+    """attempts 回連続で失敗した後、次の試行までに待つ時間（秒）"""
+    return min(base * 2 ** max(attempts - 1, 0), maximum)
+
+
+class CrawlManifest:
+    """
+    URLごとのクロールの状態（状態、試行回数、取得日時、スクリーンショットのハッシュ、描画が落ち着くまでの時間）を
+    SQLiteに記録し、中断したクロールの再開や失敗したURLのみの再試行に使う
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute(SCHEMA)
+
+    def get(self, url):
+        """URLの記録を返す（記録がない場合は None）"""
+        return self._connection.execute("SELECT * FROM captures WHERE url = ?", (url,)).fetchone()
+
+    def select_urls(self, urls, freshness=DEFAULT_FRESHNESS, max_attempts=DEFAULT_MAX_ATTEMPTS, now=None):
+        """
+        urls のうち、今回取得すべきURLを順序を保って返す。
+        - 未取得のURLと、前回の実行が中断されて取得中のまま残っているURL
+        - 取得から freshness 秒以上経ったURL
+        - 失敗したURLのうち、バックオフの待機時間が過ぎていて試行回数が max_attempts 未満のもの
+        - 試行回数が max_attempts に達したURLのうち、最後の失敗から freshness 秒以上経ったもの
+          （1回だけ再試行し、また失敗した場合は次の freshness 秒後まで待つ）
+        """
+        now = time.time() if now is None else now
+        selected = []
+        for url in urls:
+            row = self.get(url)
+            if row is None or row["status"] in (PENDING, IN_PROGRESS):
+                selected.append(url)
+            elif row["status"] == DONE:
+                if row["captured_at"] is None or now - row["captured_at"] >= freshness:
+                    selected.append(url)
+            elif row["attempts"] < max_attempts:
+                if (row["next_attempt_at"] or 0) <= now:
+                    selected.append(url)
+            elif now - row["updated_at"] >= freshness:
+                selected.append(url)
+        return selected
+
+    def mark_started(self, url):
+        """取得を開始したことを記録し、試行回数を1増やす"""
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                """INSERT INTO captures (url, status, attempts, updated_at) VALUES (?, ?, 1, ?)
+                   ON CONFLICT(url) DO UPDATE SET status = excluded.status, attempts = attempts + 1,
+                                                  updated_at = excluded.updated_at""",
+                (url, IN_PROGRESS, now))
+
+    def record_success(self, url, screenshot_hash, settle_time):
+        """取得に成功したことを記録する（試行回数は次の失敗に備えて0に戻す）"""
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                """UPDATE captures SET status = ?, attempts = 0, updated_at = ?, captured_at = ?,
+                                       next_attempt_at = NULL, screenshot_hash = ?, settle_time = ?, error = NULL
+                   WHERE url = ?""",
+                (DONE, now, now, screenshot_hash, settle_time, url))
+
+    def record_failure(self, url, error) -> float:
+        """取得に失敗したことを記録し、次の試行までに待つ時間（秒）を返す"""
+        now = time.time()
+        attempts = self.get(url)["attempts"]
+        delay = backoff_delay(attempts)
+        with self._connection:
+            self._connection.execute(
+                "UPDATE captures SET status = ?, updated_at = ?, next_attempt_at = ?, error = ? WHERE url = ?",
+                (FAILED, now, now + delay, str(error), url))
+        return delay
+
+    def status_counts(self) -> dict:
+        """状態ごとのURL数"""
+        rows = self._connection.execute("SELECT status, COUNT(*) FROM captures GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from scripts.common import color, colordiff, jsonstream
+from scripts.snapshot import crawlManifest
+from scripts.snapshot.fixtureServer import FIXTURES_DIR, fixture_urls, serve_fixtures
+from scripts.snapshot.pageSettle import SettleConfig
+from scripts.snapshot.snapshotToPalatte import FINAL_PALETTE_SIZE
+from scripts.snapshot.streamPipeline import run_pipeline
+from scripts.snapshot.website_crawler import capture_screenshots_async
+
+# 動作確認の設定（フィクスチャのページ数より小さくし、ワーカーがURLを複数取り出す場合も確認する）
+SMOKE_CONCURRENCY = 2
+SMOKE_PAGES_PER_CONTEXT = 2  # コンテキストの作り直しも確認する
+SMOKE_SETTLE_CEILING = 5.0
+# 接続できないURL（キャプチャの失敗とマニフェストへの記録を確認する）
+UNREACHABLE_URL = "http://127.0.0.1:9/unreachable.html"
+# フィクスチャのページごとに、描画が落ち着いた後のファーストビューに含まれるはずの色
+EXPECTED_COLORS = {
+    "static.html": ["#2eacd8", "#f5f0ec"],
+    "animated.html": ["#1e2a44"],  # アニメーションの終了後の背景色
+    "delayed.html": ["#fb7a3d"],  # 読み込みの1秒後に追加されるバナーの色
+}
+COLOR_TOLERANCE = 0.05  # 期待する色とパレットの色のOKLabでの距離の上限
+
+
+def find_color(palette, expected) -> bool:
+    """パレットに expected と COLOR_TOLERANCE 以内の色が含まれるか"""
+    srgb = color.hex_to_srgb_batch(palette + [expected])
+    oklab = color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(srgb))
+    return bool((colordiff.delta_e_ok(oklab[:-1], oklab[-1]) <= COLOR_TOLERANCE).any())
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def check_capture(urls, work_dir, settle):
+    """capture_screenshots_async でPNGを保存し、結果とマニフェストの記録を確認する"""
+    output_dir = os.path.join(work_dir, "screenshots")
+    with crawlManifest.CrawlManifest(os.path.join(work_dir, "manifest.sqlite")) as manifest:
+        check(manifest.select_urls(urls + [UNREACHABLE_URL]) == urls + [UNREACHABLE_URL],
+              "all URLs should be selected on the first run")
+        results = asyncio.run(capture_screenshots_async(urls + [UNREACHABLE_URL], SMOKE_CONCURRENCY,
+                                                        SMOKE_PAGES_PER_CONTEXT, output_dir, settle, manifest))
+
+        for url in urls:
+            result = results[url]
+            check(result.error is None, f"{url} failed: {result.error}")
+            with open(result.path, 'rb') as file:
+                check(hashlib.sha256(file.read()).hexdigest() == result.screenshot_hash,
+                      f"hash of {result.path} does not match")
+            row = manifest.get(url)
+            check(row["status"] == crawlManifest.DONE and row["screenshot_hash"] == result.screenshot_hash,
+                  f"manifest entry of {url} is {dict(row)}")
+        check(results[UNREACHABLE_URL].error is not None, f"{UNREACHABLE_URL} should fail")
+        check(manifest.get(UNREACHABLE_URL)["status"] == crawlManifest.FAILED,
+              f"{UNREACHABLE_URL} should be recorded as failed")
+
+        # 取得済みのURLは新しく、失敗したURLはバックオフの待機中なので、再実行では何も選ばれない
+        check(manifest.select_urls(urls + [UNREACHABLE_URL]) == [], "nothing should be selected on a re-run")
+        print(f"capture: {manifest.status_counts()}")
+
+
+def check_pipeline(urls, work_dir, settle):
+    """run_pipeline でキャプチャからパレット抽出までを行い、ページごとのパレットを確認する"""
+    output_path = os.path.join(work_dir, "stream_palettes.ndjson")
+    extracted = asyncio.run(run_pipeline(urls, output_path, SMOKE_CONCURRENCY, workers=1, queue_size=1,
+                                         pages_per_context=SMOKE_PAGES_PER_CONTEXT, settle=settle))
+    check(extracted == len(urls), f"{extracted} of {len(urls)} palettes extracted")
+
+    palettes = {record["url"]: record["palette"] for record in jsonstream.iter_records(output_path)}
+    check(sorted(palettes) == sorted(urls), f"unexpected URLs in {output_path}: {sorted(palettes)}")
+    for url, palette in palettes.items():
+        check(len(palette) <= FINAL_PALETTE_SIZE, f"{url}: {palette}")
+        for expected in EXPECTED_COLORS.get(url.rsplit('/', 1)[-1], []):
+            check(find_color(palette, expected), f"{url}: {expected} not found in {palette}")
+        print(f"pipeline: {url} {palette}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="フィクスチャのページを配信し、非同期キャプチャ・マニフェスト・パレット抽出までを実際に動かして確認する")
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR, help="配信するHTMLのディレクトリ")
+    parser.add_argument("--settle-ceiling", type=float, default=SMOKE_SETTLE_CEILING,
+                        help="描画が落ち着くまで待つ時間の上限（秒）")
+    args = parser.parse_args()
+
+    settle = SettleConfig(ceiling=args.settle_ceiling)
+    with serve_fixtures(args.fixtures_dir) as base_url, tempfile.TemporaryDirectory() as work_dir:
+        urls = fixture_urls(base_url, args.fixtures_dir)
+        check_capture(urls, work_dir, settle)
+        check_pipeline(urls, work_dir, settle)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
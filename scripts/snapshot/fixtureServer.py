@@ -0,0 +1,67 @@
+import argparse
+import contextlib
+import functools
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# クローラーの動作確認用のHTMLを置いたディレクトリ
+FIXTURES_DIR = "../../data/fixtures/pages/"
+DEFAULT_HOST = "127.0.0.1"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """アクセスログを出力しないハンドラー"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fixture_urls(base_url, fixtures_dir=FIXTURES_DIR):
+    """fixtures_dir 内のHTMLファイルのURLリストを返す"""
+    names = sorted(name for name in os.listdir(fixtures_dir) if name.endswith('.html'))
+    return [f"{base_url}/{name}" for name in names]
+
+
+@contextlib.contextmanager
+def serve_fixtures(fixtures_dir=FIXTURES_DIR, host=DEFAULT_HOST, port=0):
+    """
+    fixtures_dir をローカルのHTTPサーバーで配信し、ベースURLを返すコンテキストマネージャー。
+    port=0 の場合は空いているポートを使う。
+    """
+    handler = functools.partial(QuietHandler, directory=fixtures_dir)
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="クローラーの動作確認用のページをローカルで配信する")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けるポート")
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR, help="配信するHTMLのディレクトリ")
+    parser.add_argument("--write-urls", help="配信するページのURLリストを website.json と同じ形式で書き出すパス")
+    args = parser.parse_args()
+
+    with serve_fixtures(args.fixtures_dir, port=args.port) as base_url:
+        urls = fixture_urls(base_url, args.fixtures_dir)
+        if args.write_urls:
+            with open(args.write_urls, 'w') as file:
+                json.dump({"urls": urls}, file, indent=2)
+        print(f"Serving {args.fixtures_dir} at {base_url}")
+        for url in urls:
+            print(url)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+from sklearn.cluster import KMeans
+from scripts.common import color
+
+# ヒストグラムの量子化ビット数（チャンネルごと）。5bitなら 32x32x32 = 32768 ビン
+HISTOGRAM_BITS = 5
+MAX_HISTOGRAM_BITS = 8  # 8bitのチャンネルをそのまま使う場合（ビン数は 2^24）
+# ヒストグラムに使うピクセルの間隔（縦横それぞれ）。2なら1280x720の画像で約23万ピクセル
+HISTOGRAM_STRIDE = 2
+
+
+def build_histogram(pixels, bits=HISTOGRAM_BITS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    uint8 のピクセル配列 (..., 3) から量子化した色ヒストグラムを作成する。
+
+    Returns:
+    counts (np.array): (ビン数,) の各ビンのピクセル数
+    sums (np.array): (ビン数, 3) の各ビンに含まれるピクセルのRGB値の合計（ビン内の平均色の計算に使う）
+    """
+    if not 1 <= bits <= MAX_HISTOGRAM_BITS:
+        raise ValueError(f"bits must be between 1 and {MAX_HISTOGRAM_BITS}: {bits}")
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    shift = 8 - bits
+    quantized = pixels >> shift
+    # ビン番号が16bitに収まる場合 (bits <= 5) は uint16 で計算する（intp より中間配列が小さく速い）
+    bin_dtype = np.uint16 if 3 * bits <= 16 else np.uint32
+    bins = ((quantized[:, 0].astype(bin_dtype) << (2 * bits))
+            | (quantized[:, 1].astype(bin_dtype) << bits) | quantized[:, 2])
+
+    size = 1 << (3 * bits)
+    counts = np.bincount(bins, minlength=size)
+    sums = np.stack([np.bincount(bins, weights=pixels[:, channel], minlength=size) for channel in range(3)], axis=-1)
+    return counts, sums
+
+
+def occupied_bins(counts, sums) -> tuple[np.ndarray, np.ndarray]:
+    """ピクセルを含むビンについて、ビン内の平均色のOKLabとピクセル数を返す"""
+    occupied = np.flatnonzero(counts)
+    weights = counts[occupied]
+    mean_rgb = sums[occupied] / weights[:, None]
+    oklab = color.linear_srgb_to_oklab_batch(color.srgb_to_linear_batch(mean_rgb / 255))
+    return oklab, weights
+
+
+def cluster_histogram(counts, sums, initial_clusters, final_colors) -> list[str]:
+    """
+    ヒストグラムの占有ビンをOKLab空間でピクセル数を重みとしてKMeansでクラスタリングし、
+    ピクセル数が多い順に final_colors 色をHex形式で返す。
+    単色に近い画像で占有ビンが final_colors より少ない場合は、最も多い色を繰り返して final_colors 色にそろえる
+    （従来の extract_palette_kmeans でも同じ色のクラスターが重複して返っていた）。
+    """
+    oklab, weights = occupied_bins(counts, sums)
+    n_clusters = min(initial_clusters, len(oklab))
+
+    kmeans = KMeans(n_clusters=n_clusters, random_state=0, n_init=1).fit(oklab, sample_weight=weights)
+    cluster_weights = np.bincount(kmeans.labels_, weights=weights, minlength=n_clusters)
+    # 重みが同じ場合もクラスター番号順に並ぶよう安定ソートする
+    sorted_indices = np.argsort(-cluster_weights, kind='stable')[:final_colors]
+    padding = np.full(final_colors - len(sorted_indices), sorted_indices[0])
+    sorted_indices = np.concatenate([sorted_indices, padding])
+
+    srgb8 = color.oklab_to_srgb8(kmeans.cluster_centers_[sorted_indices])
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in srgb8.tolist()]
+
+
+def extract_histogram_palette(pixels, initial_clusters, final_colors, bits=HISTOGRAM_BITS,
+                              stride=HISTOGRAM_STRIDE) -> list[str]:
+    """
+    (高さ, 幅, 3) の uint8 のピクセル配列から、量子化ヒストグラムとOKLabでの重み付きクラスタリングでパレットを抽出する。
+    ピクセルは画像全体から縦横 stride 間隔で等間隔に取る（1で全ピクセル）。
+    """
+    pixels = np.asarray(pixels)
+    counts, sums = build_histogram(pixels[::stride, ::stride], bits)
+    return cluster_histogram(counts, sums, initial_clusters, final_colors)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from scripts.common import instrument
+from scripts.snapshot.histogramPalette import HISTOGRAM_BITS, HISTOGRAM_STRIDE, build_histogram, cluster_histogram
+from scripts.snapshot.imageDecode import MAX_PIXELS, load_image
+
+# スクリーンショットごとのヒストグラムとサムネイルを保存するディレクトリ（ファイル名は画像のSHA-256）
+SIDECAR_DIR = "../../data/processed/histograms/"
+SIDECAR_VERSION = 2  # 保存形式を変えた場合に増やす（古いファイルは作り直される）
+THUMBNAIL_SIZE = (320, 320)  # サムネイルの最大サイズ（縦横比は保つ）
+NO_MAX_PIXELS = -1  # max_pixels = None（縮小しない）を保存する際の値
+
+
+class HistogramSidecar(NamedTuple):
+    counts: np.ndarray  # (ビン数,) の各ビンのピクセル数
+    sums: np.ndarray  # (ビン数, 3) の各ビンのRGB値の合計
+    thumbnail: np.ndarray  # (高さ, 幅, 3) の uint8 のサムネイル
+    bits: int
+    stride: int
+    max_pixels: int | None
+
+    def matches(self, bits, stride, max_pixels) -> bool:
+        """ヒストグラムが指定したパラメータで作られたものか"""
+        return (self.bits, self.stride, self.max_pixels) == (bits, stride, max_pixels)
+
+
+def image_hash(image_path) -> str:
+    """画像ファイルの内容のSHA-256"""
+    with open(image_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def sidecar_path(image_hash, sidecar_dir=SIDECAR_DIR) -> str:
+    return os.path.join(sidecar_dir, f"{image_hash}.npz")
+
+
+def build_sidecar(image_path, bits=HISTOGRAM_BITS, stride=HISTOGRAM_STRIDE, max_pixels=MAX_PIXELS) -> HistogramSidecar:
+    """画像を1回だけデコードし、ヒストグラムとサムネイルを作成する"""
+    image = load_image(image_path, max_pixels)
+    counts, sums = build_histogram(np.asarray(image)[::stride, ::stride], bits)
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE, Image.Resampling.BOX, reducing_gap=2.0)
+    return HistogramSidecar(counts, sums, np.asarray(thumbnail), bits, stride, max_pixels)
+
+
+def save_sidecar(sidecar, path):
+    """
+    サイドカーを圧縮した .npz として保存する。
+    ヒストグラムはピクセルを含むビンのみを (ビン番号, ピクセル数, RGB合計) の整数で保存する
+    （ビン番号は bits = 8 の 24bit まで表せるよう uint32 にする）。
+    同じ内容の画像を複数のプロセスが同時に保存することがあるため、プロセスごとに別の一時ファイルに書いてから置き換える。
+    """
+    occupied = np.flatnonzero(sidecar.counts)
+    max_pixels = NO_MAX_PIXELS if sidecar.max_pixels is None else sidecar.max_pixels
+    temp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path),
+                                            suffix=".tmp", delete=False)
+    try:
+        with temp_file:
+            np.savez_compressed(temp_file, version=SIDECAR_VERSION, bins=occupied.astype(np.uint32),
+                                counts=sidecar.counts[occupied].astype(np.uint32),
+                                sums=np.rint(sidecar.sums[occupied]).astype(np.uint64), thumbnail=sidecar.thumbnail,
+                                params=np.array([sidecar.bits, sidecar.stride, max_pixels], dtype=np.int64))
+        os.replace(temp_file.name, path)
+    except BaseException:
+        os.remove(temp_file.name)
+        raise
+
+
+def load_sidecar(path) -> HistogramSidecar | None:
+    """保存したサイドカーを読み込む（ファイルがない場合や形式が古い場合は None）"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if int(data["version"]) != SIDECAR_VERSION:
+            return None
+        bits, stride, max_pixels = (int(value) for value in data["params"])
+        max_pixels = None if max_pixels == NO_MAX_PIXELS else max_pixels
+        size = 1 << (3 * bits)
+        counts = np.zeros(size, dtype=np.int64)
+        sums = np.zeros((size, 3), dtype=np.float64)
+        counts[data["bins"]] = data["counts"]
+        sums[data["bins"]] = data["sums"]
+        return HistogramSidecar(counts, sums, data["thumbnail"], bits, stride, max_pixels)
+
+
+def get_sidecar(image_path, image_hash_value=None, bits=HISTOGRAM_BITS, stride=HISTOGRAM_STRIDE,
+                max_pixels=MAX_PIXELS, sidecar_dir=SIDECAR_DIR) -> HistogramSidecar:
+    """
+    画像のサイドカーを返す。保存済みのものがないか、異なるパラメータで作られている場合は
+    画像をデコードして作り直し、保存する。
+    """
+    image_hash_value = image_hash_value or image_hash(image_path)
+    path = sidecar_path(image_hash_value, sidecar_dir)
+    with instrument.stage("sidecar_load"):
+        sidecar = load_sidecar(path)
+    if sidecar is None or not sidecar.matches(bits, stride, max_pixels):
+        instrument.count("sidecar_cache_misses")
+        with instrument.stage("decode"):
+            sidecar = build_sidecar(image_path, bits, stride, max_pixels)
+        os.makedirs(sidecar_dir, exist_ok=True)
+        save_sidecar(sidecar, path)
+    else:
+        instrument.count("sidecar_cache_hits")
+    return sidecar
+
+
+def extract_sidecar_palette(sidecar, initial_clusters, final_colors) -> list[str]:
+    """サイドカーのヒストグラムからパレットを抽出する（画像のデコードは行わない）"""
+    with instrument.stage("cluster"):
+        return cluster_histogram(sidecar.counts, sidecar.sums, initial_clusters, final_colors)
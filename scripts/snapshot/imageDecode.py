@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# デコード後の最大ピクセル数（これを超える画像は整数倍に縮小して読み込む）。ファーストビュー1枚分
+MAX_PIXELS = 1280 * 720
+# 透過部分を合成する背景色（ブラウザの既定の背景色）
+BACKGROUND = (255, 255, 255)
+
+
+def reduction_factor(size, max_pixels=MAX_PIXELS) -> int:
+    """幅と高さが size の画像を max_pixels 以下にするための最小の整数の縮小率"""
+    width, height = size
+    if max_pixels is None or width * height <= max_pixels:
+        return 1
+    return math.ceil(math.sqrt(width * height / max_pixels))
+
+
+def has_alpha(image) -> bool:
+    return image.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in image.info
+
+
+def to_rgb(image, background=BACKGROUND) -> Image.Image:
+    """
+    画像をRGBモードに変換する。
+    透過のある画像（RGBA、透過色付きのパレット画像など）はアルファ値で background に合成する
+    （convert('RGB') は透過部分の下にある色をそのまま残してしまうため）。RGBの画像はそのまま返す。
+    """
+    if image.mode == 'RGB':
+        return image
+    if not has_alpha(image):
+        return image.convert('RGB')
+    rgba = image.convert('RGBA')
+    composed = Image.new('RGB', rgba.size, background)
+    composed.paste(rgba, mask=rgba.getchannel('A'))
+    return composed
+
+
+def load_image(source, max_pixels=MAX_PIXELS, background=BACKGROUND) -> Image.Image:
+    """
+    画像ファイル（パスまたはファイルオブジェクト）をRGBで読み込む。
+    max_pixels を超える画像は、JPEGではデコード時に縮小し（draft）、それ以外はデコード直後に
+    整数倍のボックス縮小（reduce）を行ってから、以降のモード変換や配列への変換を小さい画像で行う。
+    """
+    image = Image.open(source)
+    factor = reduction_factor(image.size, max_pixels)
+    if factor > 1:
+        # JPEGの場合は 1/2, 1/4, 1/8 のうち要求サイズ以上で最小の縮小率でデコードされる（他の形式では何もしない）
+        image.draft('RGB', (image.width // factor, image.height // factor))
+        factor = reduction_factor(image.size, max_pixels)
+
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        # パレット画像などは reduce できないため、先にRGBに変換する
+        image = to_rgb(image, background)
+    if factor > 1:
+        # RGBA / LA は乗算済みアルファで縮小されるため、透過部分の色は混ざらない
+        image = image.reduce(factor)
+    return to_rgb(image, background)
+
+
+def load_pixels(source, max_pixels=MAX_PIXELS, background=BACKGROUND) -> np.ndarray:
+    """
+    画像を (高さ, 幅, 3) の uint8 配列として読み込む。
+    配列はPILが書き出したバイト列をそのまま参照する読み取り専用のビューで、NumPy側ではコピーしない。
+    """
+    return np.asarray(load_image(source, max_pixels, background))
@@ -0,0 +1,76 @@
+import asyncio
+import io
+import time
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+# 判定用フレームの設定
+FRAME_SIZE = (160, 90)  # JPEGのドラフトモードでこのサイズ以上の最小の縮小率でデコードする
+FRAME_QUALITY = 30  # 判定用のスクリーンショットのJPEG品質（低いほど速い）
+
+# フォントの読み込みと、有限回のアニメーションが全て終わっているか
+# （無限に繰り返すアニメーションは終わらないため対象外とする）
+ANIMATIONS_DONE_SCRIPT = """() =>
+    document.fonts.status === 'loaded' &&
+    document.getAnimations().every(animation =>
+        animation.playState !== 'running' || animation.effect.getComputedTiming().iterations === Infinity)
+"""
+
+
+class SettleConfig(NamedTuple):
+    ceiling: float = 8.0  # 待機の上限（秒）
+    interval: float = 0.25  # フレームを取得する間隔（秒）
+    stable_frames: int = 3  # 連続してこの回数変化がなければ描画が落ち着いたとみなす
+    threshold: float = 1.0  # フレーム間の平均絶対差（0-255）がこれ以下なら変化なしとみなす
+
+
+def decode_frame(data) -> np.ndarray:
+    """JPEGのスクリーンショットを縮小デコードし、(高さ, 幅) のグレースケール配列を返す"""
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', FRAME_SIZE)
+    return np.asarray(image.convert('L'), dtype=np.int16)
+
+
+def frame_difference(frame_a, frame_b) -> float:
+    """2つのフレームの平均絶対差。サイズが異なる場合（ビューポートの変化など）は無限大とする"""
+    if frame_a.shape != frame_b.shape:
+        return float('inf')
+    return float(np.abs(frame_a - frame_b).mean())
+
+
+async def capture_frame(page) -> np.ndarray:
+    """ページの現在の表示を低解像度のフレームとして取得する"""
+    return decode_frame(await page.screenshot(type='jpeg', quality=FRAME_QUALITY))
+
+
+async def animations_done(page) -> bool:
+    """フォントの読み込みと有限回のアニメーションが終わっているか"""
+    try:
+        return bool(await page.evaluate(ANIMATIONS_DONE_SCRIPT))
+    except Exception:
+        # ナビゲーション中などで評価できない場合は終わっていないとみなす
+        return False
+
+
+async def wait_for_settle(page, config=SettleConfig()) -> float:
+    """
+    ページの描画が落ち着くまで待ち、待機した時間（秒）を返す。
+
+    interval 秒ごとに低解像度のフレームを取得し、次のどちらかを満たした時点で終了する。
+    - stable_frames 回連続でフレームが変化しない
+    - フォントとアニメーションが終わっていて、直前のフレームから変化がない
+    どちらも満たさない場合は ceiling 秒で打ち切る。
+    """
+    start = time.perf_counter()
+    previous = await capture_frame(page)
+    stable = 0
+    while time.perf_counter() - start < config.ceiling:
+        await asyncio.sleep(config.interval)
+        frame = await capture_frame(page)
+        stable = stable + 1 if frame_difference(frame, previous) <= config.threshold else 0
+        previous = frame
+        if stable >= config.stable_frames or (stable and await animations_done(page)):
+            break
+    return time.perf_counter() - start
@@ -1,9 +1,15 @@
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.cluster import KMeans
 from PIL import Image
 import numpy as np
+from scripts.common import instrument, jsonstream
 from scripts.common.color import Srgb  # カラーモデルのクラスをインポート
+from scripts.snapshot.imageDecode import load_pixels, to_rgb, MAX_PIXELS
+from scripts.snapshot import histogramSidecar
+from scripts.snapshot.histogramPalette import extract_histogram_palette, HISTOGRAM_BITS, HISTOGRAM_STRIDE
 
 # 定数の設定
 SCREENSHOTS_DIR = "../../data/screenshots/"  # スクリーンショットの保存先ディレクトリ
@@ -11,6 +17,9 @@ OUTPUT_JSON_FILE = "../../data/results/color_palettes.json"  # 出力するJSON
 URLS_FILE = "../../data/raw/website.json"  # URLリストが保存されたJSONファイル
 INITIAL_CLUSTER_COUNT = 10  # 初期のKMeansクラスター数
 FINAL_PALETTE_SIZE = 4  # 最終的なカラーパレットの色数
+# 抽出済みのパレットを記録するキャッシュ（NDJSON、1行1スクリーンショット、抽出が終わるたびに追記）
+CACHE_FILE = "../../data/results/color_palettes.cache.ndjson"
+DEFAULT_WORKERS = 1  # パレット抽出を並列に行うプロセス数
 
 def load_urls(file_path=URLS_FILE):
     """website.jsonからURLリストを読み込む"""
@@ -25,9 +34,18 @@ def load_urls(file_path=URLS_FILE):
         print("Error decoding JSON.")
         return []
 
-def extract_palette(image_path, initial_clusters=INITIAL_CLUSTER_COUNT, final_colors=FINAL_PALETTE_SIZE):
-    """画像からKMeansで多めにクラスターを作成し、上位の色を選んでHex形式で返す"""
-    image = Image.open(image_path)
+def extract_palette(image_path, initial_clusters=INITIAL_CLUSTER_COUNT, final_colors=FINAL_PALETTE_SIZE,
+                    bits=HISTOGRAM_BITS, stride=HISTOGRAM_STRIDE, max_pixels=MAX_PIXELS):
+    """
+    画像全体から縦横 stride 間隔で取ったピクセルで量子化した色ヒストグラムを作成し、占有ビンをOKLab空間で重み付きクラスタリングして、
+    上位の色をHex形式で返す。max_pixels を超える画像（フルページのスクリーンショットなど）は縮小して読み込む。
+    """
+    pixels = load_pixels(image_path, max_pixels)
+    return extract_histogram_palette(pixels, initial_clusters, final_colors, bits, stride)
+
+def extract_palette_kmeans(image_path, initial_clusters=INITIAL_CLUSTER_COUNT, final_colors=FINAL_PALETTE_SIZE):
+    """（従来の方法）画像を縮小してRGBのピクセルをKMeansで多めにクラスターを作成し、上位の色を選んでHex形式で返す"""
+    image = to_rgb(Image.open(image_path))  # 透過やパレットのある画像もRGBの3チャンネルにそろえる
     image = image.resize((100, 100))  # 計算負荷を下げるためにサイズを縮小
     image_np = np.array(image)
     image_np = image_np.reshape(-1, 3)  # ピクセル単位で色を配列に変換
@@ -45,35 +63,128 @@ def extract_palette(image_path, initial_clusters=INITIAL_CLUSTER_COUNT, final_co
     palette = [Srgb(colors[i][0] / 255, colors[i][1] / 255, colors[i][2] / 255).to_hex().hex_value for i in sorted_indices]
     return palette
 
-def analyze_images(urls):
-    """取得したスクリーンショットのカラーパレットを分析してJSONに保存"""
-    results = []
+def screenshot_path(url):
+    """URLに対応するスクリーンショットのファイルパスを返す"""
+    return f"{SCREENSHOTS_DIR}{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png"
+
+def extraction_params(initial_clusters=INITIAL_CLUSTER_COUNT, final_colors=FINAL_PALETTE_SIZE,
+                      bits=HISTOGRAM_BITS, stride=HISTOGRAM_STRIDE, max_pixels=MAX_PIXELS):
+    """抽出結果に影響するパラメータ（キャッシュの照合に使う）"""
+    return {"method": "histogram", "initial_clusters": initial_clusters, "final_colors": final_colors,
+            "bits": bits, "stride": stride, "max_pixels": max_pixels}
+
+def load_cache(cache_path=CACHE_FILE):
+    """キャッシュを読み込み、URLごとの最新のエントリを返す（同じURLは後の行が優先）"""
+    cache = {}
+    if not os.path.exists(cache_path):
+        return cache
+    with open(cache_path, 'r') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                cache[entry["url"]] = entry
+            except (json.JSONDecodeError, TypeError, KeyError) as e:
+                # 書き込み途中で中断された行などは読み飛ばし、以降の行は引き続き使う
+                print(f"Ignoring line {line_number} of {cache_path}: {e!r}")
+    return cache
+
+def save_cache(entries, cache_path=CACHE_FILE):
+    """キャッシュを現在のエントリだけで書き直す（追記で増えた古い行を取り除く）"""
+    temp_path = f"{cache_path}.tmp"
+    with jsonstream.NdjsonWriter(temp_path) as writer:
+        for entry in entries:
+            writer.write(entry)
+    os.replace(temp_path, cache_path)
+
+def extract_palette_entry(url, image_path, image_hash, params):
+    """
+    1枚のスクリーンショットからパレットを抽出し、キャッシュのエントリを返す（ワーカープロセスで実行される）。
+    ヒストグラムのサイドカーがあればPNGはデコードせず、クラスタリングのみを行う。
+    """
+    sidecar = histogramSidecar.get_sidecar(image_path, image_hash, params["bits"], params["stride"],
+                                           params["max_pixels"])
+    palette = histogramSidecar.extract_sidecar_palette(sidecar, params["initial_clusters"], params["final_colors"])
+    return {"url": url, "hash": image_hash, "params": params, "palette": palette}
+
+def analyze_images(urls, workers=DEFAULT_WORKERS, cache_path=CACHE_FILE, use_cache=True, params=None):
+    """
+    取得したスクリーンショットのカラーパレットを分析してJSONに保存。
+    PNGの内容と抽出パラメータが前回と同じスクリーンショットはキャッシュの結果を使い、
+    それ以外を workers プロセスで並列に抽出する。抽出結果は終わったものから順にキャッシュへ追記する。
+    """
+    params = params or extraction_params()
+    with instrument.stage("load"):
+        cache = load_cache(cache_path) if use_cache else {}
 
+    entries = {}
+    pending = []
     for url in urls:
-        # ファイル名の生成
-        filename = f"{SCREENSHOTS_DIR}{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png"
+        filename = screenshot_path(url)
+        if not os.path.exists(filename):
+            print(f"Screenshot not found for {url}")
+            continue
+        with instrument.stage("hash"):
+            image_hash = histogramSidecar.image_hash(filename)
+        cached = cache.get(url)
+        if cached is not None and cached.get("hash") == image_hash and cached.get("params") == params:
+            entries[url] = cached
+            instrument.count("result_cache_hits")
+        else:
+            pending.append((url, filename, image_hash))
+            instrument.count("result_cache_misses")
+    instrument.count(instrument.ITEMS_COUNTER, len(entries) + len(pending))
+    print(f"{len(entries)} cached, {len(pending)} to extract")
 
-        if os.path.exists(filename):
+    with jsonstream.NdjsonWriter(cache_path, append=use_cache) as writer:
+        def record(url, compute):
             try:
-                palette = extract_palette(filename)
-                results.append({"url": url, "palette": palette})
-                print(f"Palette extracted for {url}")
+                with instrument.stage("extract"):
+                    entry = compute()
             except Exception as e:
                 print(f"Error extracting palette for {url}: {e}")
+                instrument.count("errors")
+                return
+            entries[url] = entry
+            with instrument.stage("serialize"):
+                writer.write(entry)
+                writer.flush()  # 途中で中断されても抽出済みの結果が残るようにする
+            print(f"Palette extracted for {url}")
+
+        if workers <= 1:
+            for url, filename, image_hash in pending:
+                record(url, lambda: extract_palette_entry(url, filename, image_hash, params))
         else:
-            print(f"Screenshot not found for {url}")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(extract_palette_entry, url, filename, image_hash, params): url
+                           for url, filename, image_hash in pending}
+                # ワーカー内のステージは計測できないため、次の結果を待った時間を記録する
+                for future in instrument.timed_iter(as_completed(futures), "wait"):
+                    record(futures[future], future.result)
 
-    # 結果をJSONに保存
-    with open(OUTPUT_JSON_FILE, 'w') as outfile:
-        json.dump(results, outfile, indent=4)
+    # URLリストの順に並べ、キャッシュを整理して結果をJSONに保存
+    ordered = [entries[url] for url in urls if url in entries]
+    with instrument.stage("serialize"):
+        save_cache(ordered, cache_path)
+        results = [{"url": entry["url"], "palette": entry["palette"]} for entry in ordered]
+        with open(OUTPUT_JSON_FILE, 'w') as outfile:
+            json.dump(results, outfile, indent=4)
     print(f"Results saved to {OUTPUT_JSON_FILE}")
 
 def main():
-    urls = load_urls()
-    if urls:
-        analyze_images(urls)
-    else:
-        print("No URLs found in website.json.")
+    parser = argparse.ArgumentParser(description="スクリーンショットからカラーパレットを抽出する")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="並列に処理するプロセス数")
+    parser.add_argument("--no-cache", action="store_true", help="キャッシュを使わずに全てのスクリーンショットを抽出し直す")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.run("snapshotToPalatte", args.metrics, args.profile, args.profile_mode):
+        urls = load_urls()
+        if urls:
+            analyze_images(urls, workers=args.workers, use_cache=not args.no_cache)
+        else:
+            print("No URLs found in website.json.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.common import jsonstream
+from scripts.snapshot import crawlManifest
+from scripts.snapshot.pageSettle import SettleConfig
+from scripts.snapshot.snapshotToPalatte import extract_palette, extraction_params
+from scripts.snapshot.website_crawler import (DEFAULT_CONCURRENCY, DEFAULT_PAGES_PER_CONTEXT, SCREENSHOTS_DIR,
+                                              URLS_FILE, capture_screenshots_async, load_urls)
+
+# キャプチャの結果を書き出すファイル（.ndjson なので1件ずつ追記される）
+OUTPUT_FILE = "../../data/results/stream_palettes.ndjson"
+DEFAULT_WORKERS = 2  # パレット抽出を行うプロセス数
+# キャプチャ済みで抽出待ちのスクリーンショットの上限。これを超えるとキャプチャ側が待つ
+DEFAULT_QUEUE_SIZE = 8
+
+
+def extract_palette_bytes(data, params):
+    """PNGのバイト列からパレットを抽出する（ワーカープロセスで実行される）"""
+    return extract_palette(io.BytesIO(data), params["initial_clusters"], params["final_colors"], params["bits"],
+                           params["stride"], params["max_pixels"])
+
+
+async def run_pipeline(urls, output_path=OUTPUT_FILE, concurrency=DEFAULT_CONCURRENCY, workers=DEFAULT_WORKERS,
+                       queue_size=DEFAULT_QUEUE_SIZE, save_dir=None, pages_per_context=DEFAULT_PAGES_PER_CONTEXT,
+                       settle=SettleConfig(), manifest=None, params=None):
+    """
+    キャプチャとパレット抽出をサイズ queue_size のキューでつなぎ、キャプチャしたものから順にパレットを抽出する。
+    PNGはメモリ上のバイト列のままワーカープロセスに渡し、save_dir が指定された場合のみファイルにも保存する。
+    抽出結果は終わったものから output_path に書き出す。
+    書き出しに失敗した場合はキャプチャを中断し、その例外を送出する（抽出の失敗はURLごとに表示して続ける）。
+
+    Returns:
+    int: パレットを抽出できたURLの数
+    """
+    params = params or extraction_params()
+    queue = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+    extracted = 0
+
+    async def on_capture(url, result):
+        # キューが一杯の場合はここで待ち、キャプチャが抽出より先に進みすぎないようにする
+        await queue.put((url, result, time.perf_counter()))
+
+    async def consume(executor, writer):
+        nonlocal extracted
+        while (item := await queue.get()) is not None:
+            url, result, captured = item
+            try:
+                palette = await loop.run_in_executor(executor, extract_palette_bytes, result.data, params)
+            except Exception as e:
+                print(f"Error extracting palette for {url}: {e}")
+                continue
+            writer.write({"url": url, "palette": palette, "settle_time": result.settle_time})
+            writer.flush()
+            extracted += 1
+            print(f"Palette extracted for {url} ({time.perf_counter() - captured:.2f}s after capture)")
+
+    async def finish(capture, consumers):
+        # 全てのキャプチャが終わったら（失敗した場合も）、抽出側に終了を知らせる
+        await asyncio.wait([capture])
+        for _ in consumers:
+            await queue.put(None)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            jsonstream.open_record_writer(output_path) as writer:
+        consumers = [asyncio.create_task(consume(executor, writer)) for _ in range(workers)]
+        capture = asyncio.create_task(capture_screenshots_async(urls, concurrency, pages_per_context, save_dir,
+                                                                settle, manifest, on_capture))
+        finisher = asyncio.create_task(finish(capture, consumers))
+        tasks = [capture, finisher, *consumers]
+        try:
+            await asyncio.gather(*consumers)
+        finally:
+            # 書き出しの失敗などで抽出側が止まった場合、キャプチャ側はキューが空かずに待ち続けるため中断する
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        capture.result()  # キャプチャ側の例外を呼び出し元に伝える
+    return extracted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キャプチャからパレット抽出までをファイルを介さずに続けて行う")
+    parser.add_argument("--urls-file", default=URLS_FILE, help="URLリストのJSONファイル")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="結果を保存するファイルのパス（拡張子が .ndjson / .jsonl の場合はNDJSON）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同時にキャプチャするページ数")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="パレット抽出を行うプロセス数")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="抽出待ちのスクリーンショットの上限")
+    parser.add_argument("--save-screenshots", action="store_true",
+                        help=f"PNGも {SCREENSHOTS_DIR} に保存する（--save-dir で変更可能）")
+    parser.add_argument("--save-dir", default=SCREENSHOTS_DIR, help="PNGを保存するディレクトリ")
+    parser.add_argument("--manifest", help="URLごとの状態を記録するSQLiteファイル（省略時は記録しない）")
+    parser.add_argument("--settle-ceiling", type=float, default=SettleConfig().ceiling,
+                        help="描画が落ち着くまで待つ時間の上限（秒）")
+    args = parser.parse_args()
+
+    urls = load_urls(args.urls_file)
+    if not urls:
+        print("No URLs found in website.json.")
+        return
+
+    manifest = crawlManifest.CrawlManifest(args.manifest) if args.manifest else None
+    try:
+        extracted = asyncio.run(run_pipeline(urls, args.output, args.concurrency, args.workers, args.queue_size,
+                                             args.save_dir if args.save_screenshots else None,
+                                             settle=SettleConfig(ceiling=args.settle_ceiling), manifest=manifest))
+    finally:
+        if manifest is not None:
+            manifest.close()
+    print(f"{extracted} palettes saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import json
 import os
-from PIL import Image
 import matplotlib.pyplot as plt
+from scripts.snapshot.histogramSidecar import get_sidecar
 
 # カラーパレットJSONファイルのパス
 PALETTES_JSON_FILE = "../../data/results/color_palettes.json"
@@ -35,10 +35,9 @@ def visualize_palettes_with_images(palettes):
         # スクリーンショット画像のファイルパス
         image_path = f"{SCREENSHOTS_DIR}{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png"
 
-        # 画像を表示
+        # 画像を表示（PNG全体の代わりにヒストグラムのサイドカーのサムネイルを使う。なければ作成される）
         if os.path.exists(image_path):
-            image = Image.open(image_path)
-            ax[i][0].imshow(image)
+            ax[i][0].imshow(get_sidecar(image_path).thumbnail)
             ax[i][0].axis('off')
         else:
             print(f"Image not found for {url}")
@@ -1,8 +1,14 @@
+import argparse
+import asyncio
+import hashlib
 import json
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
-import sys
+from scripts.snapshot import crawlManifest
+from scripts.snapshot.pageSettle import SettleConfig, wait_for_settle
 
 # スクリーンショットの保存先ディレクトリ
 SCREENSHOTS_DIR = "../../data/screenshots/"
@@ -10,10 +16,24 @@ SCREENSHOTS_DIR = "../../data/screenshots/"
 URLS_FILE = "../../data/raw/website.json"
 # デフォルトの並列数
 DEFAULT_CONCURRENCY = 5
+# 1つのブラウザコンテキストで取得するページ数（これを超えたらコンテキストを作り直してメモリを解放する）
+DEFAULT_PAGES_PER_CONTEXT = 20
+# ページの読み込みの待機時間（ミリ秒）
+GOTO_TIMEOUT = 60000
+NETWORK_IDLE_TIMEOUT = 30000
+# アニメーションが終わるのを待つ時間（ミリ秒、threads モードのみ。async モードは描画が落ち着くまで待つ）
+SETTLE_WAIT = 5000
 
 # 保存先ディレクトリが存在しない場合は作成
 os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
 
+class CaptureResult(NamedTuple):
+    path: str | None  # 保存したスクリーンショットのパス（失敗した場合は None）
+    settle_time: float | None  # 描画が落ち着くまで待った時間（秒）
+    screenshot_hash: str | None = None  # 保存したPNGのSHA-256
+    error: Exception | None = None
+    data: bytes | None = None  # PNGのバイト列（on_capture に渡すときのみ保持する）
+
 def load_urls(file_path=URLS_FILE):
     """website.jsonからURLリストを読み込む"""
     try:
@@ -27,22 +47,26 @@ def load_urls(file_path=URLS_FILE):
         print("Error decoding JSON.")
         return []
 
+def screenshot_path(url, output_dir=SCREENSHOTS_DIR):
+    """URLをスクリーンショットのファイルパスに変換"""
+    return os.path.join(output_dir, f"{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png")
+
 def capture_screenshot(url):
     """1つのURLのスクリーンショットを取得"""
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         try:
             page = browser.new_page()
-            page.goto(url, timeout=60000)  # URLにアクセス
+            page.goto(url, timeout=GOTO_TIMEOUT)  # URLにアクセス
 
             # ページの読み込み完了を待機
-            page.wait_for_load_state("networkidle", timeout=30000)  # ネットワークが静止状態になるまで待機
+            page.wait_for_load_state("networkidle", timeout=NETWORK_IDLE_TIMEOUT)  # ネットワークが静止状態になるまで待機
 
             # アニメーションが終わるのを待つため5秒待機
-            page.wait_for_timeout(5000)
+            page.wait_for_timeout(SETTLE_WAIT)
 
             # URLをファイル名に変換
-            filename = f"{SCREENSHOTS_DIR}{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png"
+            filename = screenshot_path(url)
 
             # ファーストビューのみをキャプチャ
             page.screenshot(path=filename)
@@ -65,15 +89,146 @@ def capture_screenshots_parallel(urls, concurrency=DEFAULT_CONCURRENCY):
             except Exception as e:
                 print(f"Error capturing screenshot for {url}: {e}")
 
+async def capture_page(context, url, output_dir=SCREENSHOTS_DIR, settle=SettleConfig()) -> CaptureResult:
+    """
+    ブラウザコンテキスト上で1つのURLのファーストビューをキャプチャする。
+    固定時間待つ代わりに、load イベントの後で描画が落ち着くまで（最大 settle.ceiling 秒）待つ。
+    output_dir が None の場合はファイルに保存せず、PNGのバイト列のみを返す。
+    """
+    page = await context.new_page()
+    try:
+        await page.goto(url, timeout=GOTO_TIMEOUT)
+        settle_time = await wait_for_settle(page, settle)
+
+        filename = screenshot_path(url, output_dir) if output_dir is not None else None
+        data = await page.screenshot(path=filename)
+        return CaptureResult(filename, settle_time, hashlib.sha256(data).hexdigest(), data=data)
+    finally:
+        await page.close()
+
+async def capture_worker(browser, queue, results, pages_per_context, output_dir, settle, manifest, on_capture):
+    """
+    キューからURLを取り出してキャプチャするワーカー。1つのワーカーが同時に開くページは1つだけ。
+    ワーカーごとに専用のブラウザコンテキストを持ち、pages_per_context ページごとに作り直す。
+    manifest が指定された場合は、URLごとの開始・成功・失敗を記録する。
+    on_capture が指定された場合は、成功したURLとPNGのバイト列を含む CaptureResult で呼び出す（コルーチン関数）。
+    """
+    context = None
+    pages = 0
+    try:
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            if context is None or pages >= pages_per_context:
+                if context is not None:
+                    await context.close()
+                context = await browser.new_context()
+                pages = 0
+
+            if manifest is not None:
+                manifest.mark_started(url)
+            try:
+                result = await capture_page(context, url, output_dir, settle)
+            except Exception as e:
+                results[url] = CaptureResult(None, None, error=e)
+                print(f"Error capturing screenshot for {url}: {e}")
+                if manifest is not None:
+                    delay = manifest.record_failure(url, e)
+                    print(f"  will retry {url} after {delay:.0f}s")
+            else:
+                # 結果一覧にはバイト列を残さない（URL数に比例してメモリを使わないようにする）
+                results[url] = result._replace(data=None)
+                print(f"Captured screenshot for: {url} (settled in {result.settle_time:.2f}s)")
+                if manifest is not None:
+                    manifest.record_success(url, result.screenshot_hash, result.settle_time)
+            if on_capture is not None and results[url].error is None:
+                # ページを閉じた後に渡す。受け取り側が詰まっている間はこのワーカーだけが待ち、他のワーカーのキャプチャは止めない
+                await on_capture(url, result)
+            pages += 1
+    finally:
+        if context is not None:
+            await context.close()
+
+async def capture_screenshots_async(urls, concurrency=DEFAULT_CONCURRENCY,
+                                    pages_per_context=DEFAULT_PAGES_PER_CONTEXT, output_dir=SCREENSHOTS_DIR,
+                                    settle=SettleConfig(), manifest=None, on_capture=None):
+    """
+    1つのブラウザを起動したまま、指定されたURLリストのスクリーンショットを非同期に取得する。
+    ワーカーを concurrency 個（URL数が少ない場合はURL数）起動し、同時に開くページ数を concurrency 以下に制限する。
+    manifest（CrawlManifest）が指定された場合は、URLごとの状態を記録する。
+    output_dir が None の場合はPNGを保存しない（on_capture でバイト列を受け取る場合に使う）。
+
+    Returns:
+    dict: URLごとの CaptureResult（保存先のパス、描画が落ち着くまでの時間、エラー）
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1: {concurrency}")
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+    results = {}
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            workers = [capture_worker(browser, queue, results, pages_per_context, output_dir, settle, manifest,
+                                      on_capture)
+                       for _ in range(min(concurrency, len(urls)))]
+            await asyncio.gather(*workers)
+        finally:
+            await browser.close()
+    return results
+
 def main():
-    # 並列数の指定（引数があれば使用、無ければデフォルト）
-    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CONCURRENCY
+    parser = argparse.ArgumentParser(description="URLリストのWebサイトのファーストビューをキャプチャする")
+    parser.add_argument("concurrency", type=int, nargs='?', default=DEFAULT_CONCURRENCY, help="並列数")
+    parser.add_argument("--mode", choices=["async", "threads"], default="async",
+                        help="async: 1つのブラウザを使い回す / threads: URLごとにブラウザを起動する（従来の方法）")
+    parser.add_argument("--pages-per-context", type=int, default=DEFAULT_PAGES_PER_CONTEXT,
+                        help="ブラウザコンテキストを作り直すまでに取得するページ数（async のみ）")
+    parser.add_argument("--urls-file", default=URLS_FILE, help="URLリストのJSONファイル")
+    parser.add_argument("--output-dir", default=SCREENSHOTS_DIR, help="スクリーンショットの保存先（async のみ）")
+    parser.add_argument("--settle-ceiling", type=float, default=SettleConfig().ceiling,
+                        help="描画が落ち着くまで待つ時間の上限（秒、async のみ）")
+    parser.add_argument("--manifest", default=crawlManifest.MANIFEST_FILE,
+                        help="URLごとの状態を記録するSQLiteファイル（async のみ）")
+    parser.add_argument("--no-manifest", action="store_true", help="状態を記録せず全てのURLを取得する")
+    parser.add_argument("--freshness-hours", type=float, default=crawlManifest.DEFAULT_FRESHNESS / 3600,
+                        help="取得済みのURLを再取得しない期間（時間）")
+    parser.add_argument("--max-attempts", type=int, default=crawlManifest.DEFAULT_MAX_ATTEMPTS,
+                        help="失敗したURLを続けて再試行する最大回数（達したURLも --freshness-hours 後に1回再試行する）")
+    args = parser.parse_args()
 
-    urls = load_urls()
-    if urls:
-        capture_screenshots_parallel(urls, concurrency)
-    else:
+    urls = load_urls(args.urls_file)
+    if not urls:
         print("No URLs found in website.json.")
+        return
+
+    if args.mode == "async":
+        settle = SettleConfig(ceiling=args.settle_ceiling)
+        manifest = None if args.no_manifest else crawlManifest.CrawlManifest(args.manifest)
+        try:
+            if manifest is not None:
+                selected = manifest.select_urls(urls, args.freshness_hours * 3600, args.max_attempts)
+                print(f"{len(selected)} of {len(urls)} URLs to capture (others are fresh, or waiting to retry)")
+                urls = selected
+            results = asyncio.run(capture_screenshots_async(urls, args.concurrency, args.pages_per_context,
+                                                            args.output_dir, settle, manifest))
+            if manifest is not None:
+                print(f"Manifest: {manifest.status_counts()}")
+        finally:
+            if manifest is not None:
+                manifest.close()
+        settle_times = [result.settle_time for result in results.values() if result.error is None]
+        if settle_times:
+            print(f"Average settle time: {sum(settle_times) / len(settle_times):.2f}s")
+    else:
+        capture_screenshots_parallel(urls, args.concurrency)
 
 if __name__ == "__main__":
     main()